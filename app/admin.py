@@ -0,0 +1,52 @@
+"""This module defines blueprint for admin routes."""
+
+#pylint: disable=import-error
+from flask import Blueprint, Response, request, url_for, abort, stream_with_context
+from app.decorators import admin_required
+from app.models import get_user_page, PAGE_SIZE
+from app.streaming import STREAM_LISTINGS, render_listing
+from app.transfer import FORMATS, import_posts, export_posts
+from app.api import dumps
+
+admin = Blueprint("admin", __name__, url_prefix="/admin")
+
+@admin.get("/users")
+@admin_required
+def users():
+    """Return a page of users, optionally searched by username or email prefix."""
+    search = request.args.get("q", "").strip()
+    after = request.args.get("after", type=int)
+    page = get_user_page(search, after=after, stream=STREAM_LISTINGS)
+    return render_listing("admin_page.html", "users", page,
+                          lambda page: next_page_url(page, search), search=search)
+
+def next_page_url(page, search: str) -> str | None:
+    """Returns URL of the page of users that follows page, or None on the last page."""
+    if len(page) < PAGE_SIZE:
+        return None
+    return url_for("admin.users", q=search or None, after=page[-1].id)
+
+def transfer_format() -> str:
+    """Returns format of imported or exported posts chosen with ?format=."""
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in FORMATS:
+        abort(400)
+    return fmt
+
+@admin.get("/posts/export")
+@admin_required
+def export():
+    """Stream every post as NDJSON or CSV (?format=csv) file."""
+    fmt = transfer_format()
+    return Response(stream_with_context(export_posts(fmt)),
+                    mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+                    headers={"Content-Disposition": f"attachment; filename=posts.{fmt}"})
+
+@admin.post("/posts/import")
+@admin_required
+def import_():
+    """Import posts from NDJSON or CSV (?format=csv) request body. Records without
+    username are added as ?username=. Running totals are streamed after each batch."""
+    totals = import_posts(request.stream, transfer_format(), request.args.get("username"))
+    return Response(stream_with_context(dumps(batch) + b"\n" for batch in totals),
+                    mimetype="application/x-ndjson")
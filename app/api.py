@@ -0,0 +1,123 @@
+"""This module defines blueprint of the versioned JSON API.
+
+Listings return {"posts": [...], "next": cursor}, pass next back as ?after=
+for the following page. ?fields=title,excerpt selects fields of each post.
+Rows are serialized straight from query results, with orjson when installed.
+Responses are compressed with br (when brotli is installed) or gzip."""
+
+#pylint: disable=import-error
+import gzip
+import json
+from datetime import datetime as dt
+from flask import Blueprint, Response, request, abort
+from flask_login import login_required
+from werkzeug.exceptions import HTTPException
+from app.forms import filter_posts_form
+from app.models import get_posts, get_post, filter_posts, get_user_posts, PAGE_SIZE
+from app.util import encode_cursor, decode_cursor
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+#Fields of posts in listings, the columns of feed queries (POST_SUMMARY)
+SUMMARY_FIELDS = ("id", "title", "excerpt", "tag", "timestamp", "created_at", "username")
+#Fields of a single post
+POST_FIELDS = SUMMARY_FIELDS + ("content", "user_id")
+#Smaller responses are not worth compressing
+COMPRESS_MIN_SIZE = 512
+
+def dumps(payload) -> bytes:
+    """Serializes payload to compact JSON."""
+    if orjson:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":"), default=dt.isoformat).encode()
+
+def json_response(payload, status: int = 200) -> Response:
+    """Returns payload as JSON response."""
+    return Response(dumps(payload), status=status, mimetype="application/json")
+
+def selected_fields(available: tuple) -> tuple:
+    """Returns fields requested with ?fields=, all available ones by default."""
+    fields = tuple(field for field in request.args.get("fields", "").split(",") if field)
+    unknown = set(fields) - set(available)
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(sorted(unknown))}.")
+    return fields or available
+
+def page_cursor() -> tuple | None:
+    """Returns decoded ?after= cursor, None for the first page."""
+    token = request.args.get("after")
+    if not token:
+        return None
+    after = decode_cursor(token)
+    if after is None:
+        abort(400, "Malformed cursor.")
+    return after
+
+def listing(posts: list) -> Response:
+    """Returns page of post summaries with selected fields and cursor of the next page."""
+    fields = selected_fields(SUMMARY_FIELDS)
+    next_cursor = None
+    if len(posts) == PAGE_SIZE:
+        next_cursor = encode_cursor(posts[-1].created_at, posts[-1].id)
+    return json_response({"posts": [{field: getattr(post, field) for field in fields}
+                                    for post in posts],
+                          "next": next_cursor})
+
+@api.get("/posts")
+@login_required
+def posts():
+    """Return a page of the feed, filtered like /apply-filter by tag, username or title."""
+    form = filter_posts_form(request.args)
+    if not (form.tag.data or form.username.data or form.title.data):
+        return listing(get_posts(after=page_cursor()))
+    if not form.validate():
+        abort(400, "Invalid filter.")
+    return listing(filter_posts(form.tag.data, form.username.data, form.title.data,
+                                after=page_cursor()))
+
+@api.get("/posts/<int:post_id>")
+@login_required
+def post(post_id: int):
+    """Return a single post with selected fields."""
+    fields = selected_fields(POST_FIELDS)
+    row = get_post(str(post_id))
+    if row is None:
+        abort(404, "No such post.")
+    found, username = row
+    return json_response({field: username if field == "username" else getattr(found, field)
+                          for field in fields})
+
+@api.get("/users/<int:user_id>/posts")
+@login_required
+def user_posts(user_id: int):
+    """Return a page of posts created by user_id."""
+    return listing(get_user_posts(user_id, after=page_cursor()))
+
+@api.errorhandler(HTTPException)
+def error(exception: HTTPException) -> Response:
+    """Return errors as JSON."""
+    return json_response({"error": exception.description}, exception.code)
+
+@api.after_request
+def compress(response: Response) -> Response:
+    """Compresses response body with br or gzip if the client accepts it."""
+    if response.direct_passthrough or response.content_length is None \
+       or response.content_length < COMPRESS_MIN_SIZE or "Content-Encoding" in response.headers:
+        return response
+    response.vary.add("Accept-Encoding")
+    accepted = request.accept_encodings
+    if brotli and accepted["br"]:
+        response.set_data(brotli.compress(response.get_data(), quality=4))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=5))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
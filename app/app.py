@@ -3,13 +3,26 @@ Authentication is not implemented yet, but the routes are there to handle the re
 
 #pylint: disable=import-error disable=unused-argument
 from secrets import token_hex
-from flask import Flask, render_template, request, redirect, g
+from datetime import datetime as dt, timezone
+from flask import Flask, render_template, request, redirect, g, url_for, jsonify
+from flask import Response, make_response
+from werkzeug.http import generate_etag
+from markupsafe import Markup
 from flask_login import LoginManager, current_user
 from app.forms import new_post_form, filter_posts_form
-from app.models import load_user, add_post, get_posts, get_post
-from app.models import filter_posts, get_user_posts, delete_post
+from app.models import load_user, add_post, get_posts, get_post, post_modified
+from app.models import filter_posts, get_user_posts, delete_post, PAGE_SIZE, CACHE
+from app.models import feed_key, feed_version, SESSION, ROUTER, FRAGMENTS
+from app.fragments import FragmentCacheExtension
+from app.streaming import STREAM_LISTINGS, render_listing
+from app.profiling import PROFILING, init_profiling
+from app.metrics import start_timer, record_request, exposition
+from app.util import encode_cursor, decode_cursor
 from app.authentication import auth
-from app.decorators import login_required
+from app.admin import admin
+from app.api import api
+from app.transfer import posts_cli
+from app.decorators import login_required, monitoring_required
 
 app = Flask(__name__)
 #Generate a random secret key
@@ -17,13 +30,32 @@ app.secret_key = token_hex(32)
 #Add application name to the global scope of Jinja templates
 app.config["application_name"] = "Sample Blog"
 
+#Cache rendered markup of posts with {% cache %} tags
+app.jinja_env.add_extension(FragmentCacheExtension)
+app.jinja_env.fragment_cache = FRAGMENTS
+
 #Register blueprints
 app.register_blueprint(auth)
+app.register_blueprint(admin)
+app.register_blueprint(api)
+
+#flask posts import/export commands
+app.cli.add_command(posts_cli)
+
+#Count and time requests for /metrics
+app.before_request(start_timer)
+app.after_request(record_request)
+
+#Opt-in request profiling, see app.profiling
+if PROFILING:
+    init_profiling(app, {ROUTER.writer, *ROUTER.readers})
 
 #Initialize flask-login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = "auth.login"
+#API clients get 401 instead of the login page
+login_manager.blueprint_login_views["api"] = None
 
 #User retrieval function for flask-login
 @login_manager.user_loader
@@ -31,13 +63,78 @@ def load_usr(user_id: str):
     """Load user by id."""
     return load_user(user_id)
 
+def page_cursor():
+    """Returns decoded ?after= cursor of the requested page.
+    Missing or malformed cursor yields the first page."""
+    token = request.args.get("after")
+    return decode_cursor(token) if token else None
+
+def next_page_url(posts) -> str | None:
+    """Returns URL of the page that follows posts, or None on the last page.
+    Other query arguments (e.g. filter criteria) are carried over."""
+    if len(posts) < PAGE_SIZE:
+        return None
+    last_post = posts[-1]
+    args = request.args.to_dict()
+    args["after"] = encode_cursor(last_post.created_at, last_post.id)
+    return url_for(request.endpoint, **args)
+
+def page_etag(*versions) -> str:
+    """Returns entity tag of the requested page built from versions of the
+    data it shows. Every page also shows the logged-in user."""
+    parts = [current_user.get_id(), *versions]
+    return generate_etag(":".join(map(str, parts)).encode())
+
+def not_modified(etag: str, last_modified: dt = None) -> Response | None:
+    """Returns 304 response if the client's copy of the requested page,
+    identified by validators, is current, otherwise None. If-None-Match
+    takes precedence over If-Modified-Since."""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = bool(last_modified and request.if_modified_since and
+                     http_date_of(last_modified) <= request.if_modified_since)
+    return with_validators(Response(status=304), etag, last_modified) if fresh else None
+
+def with_validators(response, etag: str, last_modified: dt = None) -> Response:
+    """Adds validators to response. Clients and proxies have to revalidate
+    before reusing it, and only the logged-in user's browser may store it."""
+    response = make_response(response)
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = http_date_of(last_modified)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def http_date_of(timestamp: dt) -> dt:
+    """Converts naive local timestamp of a post to UTC with HTTP date precision."""
+    return timestamp.astimezone(timezone.utc).replace(microsecond=0)
+
 @app.route("/")
 @login_required
 def index():
-    """Return homepage with preview of latest hundred posts."""
+    """Return homepage with preview of a page of latest hundred posts."""
+    #Feed version changes with every post write, checked before any query
+    version = feed_version()
+    etag = page_etag(version) if version else None
+    response = not_modified(etag) if etag else None
+    if response:
+        return response
     form = filter_posts_form(request.form)
-    posts = get_posts()
-    return render_template("home.html", posts=posts, form=form)
+    after = page_cursor()
+    #Post cards are identical for all users, so rendered markup is cached
+    #next to the feed page and invalidated with it
+    key = feed_key("cards", after)
+    cached = CACHE.get(key)
+    if cached is None:
+        posts = get_posts(after=after)
+        cached = (render_template("post_cards.html", posts=posts),
+                  next_page_url(posts))
+        CACHE.set(key, cached)
+    cards, next_url = cached
+    response = render_template("home.html", cards=Markup(cards), form=form, next_url=next_url)
+    return with_validators(response, etag) if etag else response
 
 @app.route("/about")
 @login_required
@@ -69,8 +166,16 @@ def read_post():
     if "id" in request.args:
         referrer = request.referrer
         post_id = request.args["id"]
+        #Only the timestamp is read before deciding whether to render
+        modified = post_modified(post_id)
+        if modified:
+            etag = page_etag(modified.isoformat(), referrer)
+            response = not_modified(etag, modified)
+            if response:
+                return response
         post = get_post(post_id)
-        return render_template("post_view.html", referrer=referrer, post=post)
+        response = render_template("post_view.html", referrer=referrer, post=post)
+        return with_validators(response, etag, modified) if modified else response
     return redirect("/")
 
 @app.get("/delete_post")
@@ -92,9 +197,10 @@ def apply_filter():
     form = filter_posts_form(request.args)
     #Get posts from database
     if form.validate():
-        posts = filter_posts(form.tag.data, form.username.data, form.title.data)
+        posts = filter_posts(form.tag.data, form.username.data, form.title.data,
+                             after=page_cursor(), stream=STREAM_LISTINGS)
         #Render homepage with filtered posts
-        return render_template("home.html", posts=posts, form=form)
+        return render_listing("home.html", "posts", posts, next_page_url, form=form)
     #Render homepage with no posts
     return render_template("home.html", form=form)
 
@@ -104,13 +210,33 @@ def my_posts():
     """Return posts created by current user."""
     referrer = request.referrer
     #Get posts from database
-    posts = get_user_posts(user_id=current_user.id)
+    posts = get_user_posts(user_id=current_user.id, after=page_cursor(),
+                           stream=STREAM_LISTINGS)
     #Render homepage with filtered posts
-    return render_template("my_posts.html", posts=posts, referrer=referrer)
+    return render_listing("my_posts.html", "posts", posts, next_page_url, referrer=referrer)
+
+@app.get("/cache-stats")
+@monitoring_required
+def cache_stats():
+    """Return cache counters for monitoring."""
+    return jsonify(CACHE.stats())
+
+@app.get("/metrics")
+@monitoring_required
+def metrics():
+    """Return metrics in Prometheus text format."""
+    body, content_type = exposition()
+    return Response(body, content_type=content_type)
+
+@app.after_request
+def add_db_timing(response):
+    """Reports how long request held database connections, see track_connection_time."""
+    if "db_connection_time" in g:
+        response.headers.add("Server-Timing",
+                             f"db-conn;dur={g.db_connection_time * 1000:.2f}")
+    return response
 
 @app.teardown_appcontext
 def close_db_session(exception=None):
-    """Closes the database session after each request."""
-    db_session = g.pop('db_session', None)
-    if db_session is not None:
-        db_session.close()
+    """Closes the database session of the request, if one was opened."""
+    SESSION.remove()
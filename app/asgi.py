@@ -0,0 +1,65 @@
+"""ASGI entry point of the application, run with e.g.:
+    uvicorn app.asgi:asgi_app
+Database-bound views are replaced by their async versions from app.async_views,
+which await aiosqlite on the server's event loop. Each request still holds an
+ASGI_EXECUTOR thread until its response is ready, as Flask waits for async
+views in the thread that dispatched them. The WSGI entry point
+(flask run / app.app:app) is unchanged."""
+
+#pylint: disable=import-error
+from os import getenv
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from app import make_app
+
+#Threads serving requests, each held for the whole request including async views
+ASGI_THREADS = int(getenv("ASGI_THREADS", "16"))
+ASGI_EXECUTOR = ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix="asgi")
+
+class ConcurrentWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """Runs each request in ASGI_EXECUTOR instead of the single thread
+    asgiref uses by default, so requests are served concurrently."""
+    #Re-wrap the undecorated method, attribute access would bind it
+    run_wsgi_app = sync_to_async(vars(WsgiToAsgiInstance)["run_wsgi_app"].func,
+                                 thread_sensitive=False, executor=ASGI_EXECUTOR)
+
+class ConcurrentWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi adapter serving requests through ConcurrentWsgiToAsgiInstance."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        await ConcurrentWsgiToAsgiInstance(self.wsgi_application,
+                                           self.duplicate_header_limit)(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Answers server startup and shutdown events,
+        closing connections of async engines on shutdown."""
+        #pylint: disable=import-outside-toplevel
+        from app.async_models import dispose_engines
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await dispose_engines()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+def make_asgi_app(name: str = None, login_disabled: bool = False) -> ConcurrentWsgiToAsgi:
+    """Returns ASGI application with async views, configured like make_app."""
+    #pylint: disable=import-outside-toplevel
+    app = make_app(name, login_disabled)
+    #Imported after make_app, which reloads app.app the views depend on
+    from app.async_views import ASYNC_VIEWS
+    from app.async_models import ASYNC_ROUTER
+    from app.profiling import PROFILING, instrument_engine
+    app.view_functions.update(ASYNC_VIEWS)
+    if PROFILING:
+        for engine in {ASYNC_ROUTER.writer, *ASYNC_ROUTER.readers}:
+            instrument_engine(engine)
+    return ConcurrentWsgiToAsgi(app)
+
+asgi_app = make_asgi_app()
@@ -0,0 +1,108 @@
+"""This module defines asyncio counterparts of app.models functions used by
+async views of the ASGI serving mode, see app.asgi. Statements and cache keys
+are shared with app.models; queries run over aiosqlite on the server's event
+loop. Flask still runs each async view through async_to_sync in the ASGI_EXECUTOR
+thread serving the request, which blocks until the view returns, so a request
+waiting for the database holds its thread as in WSGI mode and throughput is
+about on par with it (see benchmarks.serving_modes)."""
+
+#pylint: disable=import-error
+import asyncio
+from datetime import datetime as dt
+from sqlalchemy import select, delete, Row
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.dbschema import Post, DB_PATH, DB_WRITE_POOL_SIZE, create_async_db_engine
+from app.routing import Router, RoutingSession
+from app.models import CACHE, PAGE_SIZE, feed_key, post_key, paginate
+from app.models import summary_query, post_query, new_post, forget_post, track_connection_time
+from app.models import post_values, POST_QUEUE
+
+#Async engines are opened lazily, WSGI mode never connects them
+ASYNC_ENGINE = create_async_db_engine(DB_PATH, pool_size=DB_WRITE_POOL_SIZE, max_overflow=0)
+ASYNC_READ_ENGINE = create_async_db_engine(DB_PATH, read_only=True)
+#Sessions route statements like request sessions of app.models
+ASYNC_ROUTER = Router(ASYNC_ENGINE.sync_engine, [ASYNC_READ_ENGINE.sync_engine])
+#Every model function runs in its own session, returning the connection on exit
+ASYNC_SESSION = async_sessionmaker(sync_session_class=RoutingSession, router=ASYNC_ROUTER,
+                                   expire_on_commit=False)
+
+for routed_engine in {ASYNC_ROUTER.writer, *ASYNC_ROUTER.readers}:
+    track_connection_time(routed_engine)
+
+async def dispose_engines() -> None:
+    """Closes pooled connections of async engines. Must be awaited before
+    the event loop that opened them ends, their threads keep the process alive."""
+    await ASYNC_ENGINE.dispose()
+    await ASYNC_READ_ENGINE.dispose()
+
+async def add_post(title: str, excerpt: str, content: str, tag: str, user_id: int) -> int:
+    """Adds post to database, through POST_QUEUE with WRITE_QUEUE=1."""
+    if POST_QUEUE:
+        return await asyncio.wrap_future(POST_QUEUE.submit(
+            post_values(title, excerpt, content, tag, user_id)))
+    post = new_post(title, excerpt, content, tag, user_id)
+    async with ASYNC_SESSION.begin() as session:
+        session.add(post)
+        await session.flush()
+        post_id = post.id
+    #Cached feed pages no longer include the newest post
+    CACHE.bump("feed")
+    return post_id
+
+async def get_posts(limit: int = PAGE_SIZE, after: tuple = None) -> list[Row]:
+    """Fetches a page of post summaries, from CACHE when possible."""
+    key = feed_key("posts", limit, after)
+    posts = CACHE.get(key)
+    if posts is None:
+        async with ASYNC_SESSION() as session:
+            posts = (await session.execute(paginate(summary_query(), limit, after))).all()
+        CACHE.set(key, posts)
+    return posts
+
+async def get_post(post_id: str) -> Row | None:
+    """Fetches single post identified by post_id along with author's username."""
+    key = post_key(post_id)
+    post = CACHE.get(key) if key else None
+    if post is not None:
+        return post
+    #Closing the session detaches the post, so it is safe to cache
+    async with ASYNC_SESSION() as session:
+        post = (await session.execute(post_query(post_id))).first()
+    if post is not None and key:
+        CACHE.set(key, post)
+    return post
+
+async def post_modified(post_id: str) -> dt | None:
+    """Returns when post was last modified, None if there is no such post."""
+    key = post_key(post_id)
+    if key is None:
+        return None
+    post = CACHE.get(key)
+    if post is not None:
+        return post[0].created_at
+    async with ASYNC_SESSION() as session:
+        return (await session.execute(select(Post.created_at).
+                                      where(Post.id == int(post_id)))).scalar()
+
+async def filter_posts(tag: str = None, username: str = None, title: str = None,
+                       limit: int = PAGE_SIZE, after: tuple = None) -> list[Row]:
+    """Filters posts by tag, username, and title. Returns post summaries."""
+    stmt = summary_query(tag, username, title)
+    async with ASYNC_SESSION() as session:
+        return (await session.execute(paginate(stmt, limit, after))).all()
+
+async def get_user_posts(user_id: int, limit: int = PAGE_SIZE,
+                         after: tuple = None) -> list[Row]:
+    """Fetches summaries of posts created by user_id."""
+    stmt = summary_query().where(Post.user_id == user_id)
+    async with ASYNC_SESSION() as session:
+        return (await session.execute(paginate(stmt, limit, after))).all()
+
+async def delete_post(post_id: int, user_id: int) -> None:
+    """Deletes post from database if it is owned by user_id."""
+    async with ASYNC_SESSION.begin() as session:
+        deleted = (await session.execute(delete(Post).where(Post.id == post_id).
+                                         where(Post.user_id == user_id).
+                                         returning(Post.id, Post.created_at))).first()
+    if deleted:
+        forget_post(*deleted)
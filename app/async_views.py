@@ -0,0 +1,93 @@
+"""This module implements async versions of the database-bound views of app.app.
+They replace the synchronous views in the ASGI serving mode, see app.asgi.
+Views that only validate forms (login, register) stay synchronous, because
+WTForms validators and password hashing are blocking."""
+
+#pylint: disable=import-error
+from flask import render_template, request, redirect
+from markupsafe import Markup
+from flask_login import current_user
+from app.forms import new_post_form, filter_posts_form
+from app.models import CACHE, feed_key, feed_version
+from app.async_models import add_post, get_posts, get_post, post_modified
+from app.async_models import filter_posts, get_user_posts, delete_post
+from app.app import page_cursor, next_page_url, page_etag, not_modified, with_validators
+from app.decorators import login_required
+
+@login_required
+async def index():
+    """Return homepage with preview of a page of latest hundred posts."""
+    version = feed_version()
+    etag = page_etag(version) if version else None
+    response = not_modified(etag) if etag else None
+    if response:
+        return response
+    form = filter_posts_form(request.form)
+    after = page_cursor()
+    key = feed_key("cards", after)
+    cached = CACHE.get(key)
+    if cached is None:
+        posts = await get_posts(after=after)
+        cached = (render_template("post_cards.html", posts=posts),
+                  next_page_url(posts))
+        CACHE.set(key, cached)
+    cards, next_url = cached
+    response = render_template("home.html", cards=Markup(cards), form=form, next_url=next_url)
+    return with_validators(response, etag) if etag else response
+
+@login_required
+async def add_post_v():
+    """Return new post page."""
+    form = new_post_form(request.form)
+
+    if request.method == "POST" and form.validate():
+        await add_post(form.title.data, form.excerpt.data,
+                       form.content.data, form.tag.data,
+                       current_user.id)
+        return redirect("/")
+
+    return render_template("new_post.html", form=form)
+
+@login_required
+async def read_post():
+    """Retrieve post from database and render post view page."""
+    if "id" in request.args:
+        modified = await post_modified(request.args["id"])
+        if modified:
+            etag = page_etag(modified.isoformat(), request.referrer)
+            response = not_modified(etag, modified)
+            if response:
+                return response
+        post = await get_post(request.args["id"])
+        response = render_template("post_view.html", referrer=request.referrer, post=post)
+        return with_validators(response, etag, modified) if modified else response
+    return redirect("/")
+
+@login_required
+async def delete_post_v():
+    """Delete post."""
+    if "id" in request.args:
+        await delete_post(request.args["id"], current_user.id)
+    return redirect(request.referrer)
+
+@login_required
+async def apply_filter():
+    """Fetch posts from database based on filter criteria."""
+    form = filter_posts_form(request.args)
+    if form.validate():
+        posts = await filter_posts(form.tag.data, form.username.data, form.title.data,
+                                   after=page_cursor())
+        return render_template("home.html", posts=posts, form=form,
+                               next_url=next_page_url(posts))
+    return render_template("home.html", form=form)
+
+@login_required
+async def my_posts():
+    """Return posts created by current user."""
+    posts = await get_user_posts(user_id=current_user.id, after=page_cursor())
+    return render_template("my_posts.html", posts=posts, referrer=request.referrer,
+                           next_url=next_page_url(posts))
+
+#Endpoints of app.app views replaced in ASGI mode
+ASYNC_VIEWS = {view.__name__: view for view in
+               (index, add_post_v, read_post, delete_post_v, apply_filter, my_posts)}
@@ -2,10 +2,10 @@
 
 #pylint: disable=import-error
 from flask import Blueprint, render_template, request, redirect
-from flask_login import login_user, logout_user
+from flask_login import login_user, logout_user, current_user
 from app.decorators import login_required, already_logged_in
 from app.forms import register_form, login_form
-from app.models import add_user, validate_user
+from app.models import add_user, forget_user
 
 auth = Blueprint("auth", __name__)
 
@@ -16,11 +16,9 @@ def login():
     form = login_form(request.form)
 
     if request.method == "POST" and form.validate():
-        #Validation has passed. User must exist in the database.
-        #Fetch user from database
-        user = validate_user(form.email.data, form.password.data)
+        #Validation has passed. User was authenticated by check_credentials.
         #Log the user in with flask-login
-        login_user(user)
+        login_user(form.user)
         #Redirect to homepage
         return redirect("/")
 
@@ -58,6 +56,9 @@ def register_get():
 @login_required
 def logout():
     """Logout route."""
+    #Drop cached user so the next login reads fresh data
+    if current_user.is_authenticated:
+        forget_user(current_user.id)
     #Log the user out with flask-login
     logout_user()
     #Redirect to login page
@@ -0,0 +1,182 @@
+"""This module implements caches that keep hot reads off the database.
+Backends share one interface. Data that cannot be invalidated key by key
+(e.g. feed pages) embeds a generation counter in its keys, and writers
+bump the counter instead. Generations are also versions of that data,
+e.g. HTTP validators, along with the epoch of the counters, which changes
+whenever they restart from zero. TTLCache suits a single worker process,
+SQLiteCache is shared by all workers on the host through a local file."""
+
+import pickle
+import sqlite3
+from secrets import token_hex
+from collections import OrderedDict
+from threading import Lock, local
+from time import monotonic, time
+
+class TTLCache:
+    """Bounded cache that evicts least recently used entries once maxsize
+    is reached and treats entries older than ttl seconds as missing.
+    Setting maxsize or ttl to 0 disables caching."""
+    #Generations only count writes of this process
+    shared = False
+
+    def __init__(self, maxsize: int = 256, ttl: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+        #Generations live as long as the process
+        self.epoch = token_hex(8)
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """Returns cached value for key, or default if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            #Mark entry as most recently used
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None) -> None:
+        """Stores value under key for ttl seconds (cache default if None),
+        evicting least recently used entries if full."""
+        ttl = self.ttl if ttl is None else ttl
+        if self.maxsize <= 0 or self.ttl <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key) -> None:
+        """Removes key from the cache."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes all entries from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def generation(self, name: str) -> int:
+        """Returns current value of generation counter name."""
+        return self._generations.get(name, 0)
+
+    def bump(self, name: str) -> None:
+        """Increments generation counter name, orphaning entries keyed by it."""
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def stats(self) -> dict:
+        """Returns hit, miss and eviction counters along with current size."""
+        with self._lock:
+            return {"backend": "memory", "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "size": len(self._entries),
+                    "maxsize": self.maxsize, "ttl": self.ttl}
+
+class SQLiteCache:
+    """Cache shared between worker processes through a local SQLite file.
+    Values are pickled. Once maxsize is exceeded the oldest written
+    entries are evicted first. Counters in stats are per process."""
+    shared = True
+
+    def __init__(self, path: str, maxsize: int = 4096, ttl: float = 30):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = local()
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS entry "
+                     "(key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS generation "
+                     "(name TEXT PRIMARY KEY, value INTEGER)")
+        #Generations live as long as the file, concurrent workers agree on one epoch
+        conn.execute("CREATE TABLE IF NOT EXISTS epoch (value TEXT)")
+        conn.execute("INSERT INTO epoch SELECT hex(randomblob(8)) "
+                     "WHERE NOT EXISTS (SELECT * FROM epoch)")
+        self.epoch = conn.execute("SELECT value FROM epoch").fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        """Returns connection to the cache file owned by the calling thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            #Readers never block the writer and losing cache on power loss is fine
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, default=None):
+        """Returns cached value for key, or default if missing or expired."""
+        row = self._connection().execute("SELECT value, expires FROM entry WHERE key = ?",
+                                         (key,)).fetchone()
+        if row is None or row[1] <= time():
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        """Stores value under key for ttl seconds (cache default if None),
+        evicting oldest entries if full."""
+        ttl = self.ttl if ttl is None else ttl
+        if self.maxsize <= 0 or self.ttl <= 0 or ttl <= 0:
+            return
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO entry VALUES (?, ?, ?)",
+                     (key, pickle.dumps(value), time() + ttl))
+        #Replaced entries get a new rowid, so rowid order is write order
+        evicted = conn.execute("DELETE FROM entry WHERE rowid <= "
+                               "(SELECT max(rowid) FROM entry) - ?",
+                               (self.maxsize,)).rowcount
+        self.evictions += evicted
+
+    def delete(self, key: str) -> None:
+        """Removes key from the cache."""
+        self._connection().execute("DELETE FROM entry WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        """Removes all entries from the cache."""
+        self._connection().execute("DELETE FROM entry")
+
+    def generation(self, name: str) -> int:
+        """Returns current value of generation counter name."""
+        row = self._connection().execute("SELECT value FROM generation WHERE name = ?",
+                                         (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, name: str) -> None:
+        """Increments generation counter name, orphaning entries keyed by it."""
+        self._connection().execute("INSERT INTO generation VALUES (?, 1) ON CONFLICT (name) "
+                                   "DO UPDATE SET value = value + 1", (name,))
+
+    def stats(self) -> dict:
+        """Returns hit, miss and eviction counters along with current size."""
+        size = self._connection().execute("SELECT count(*) FROM entry").fetchone()[0]
+        return {"backend": "sqlite", "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": size,
+                "maxsize": self.maxsize, "ttl": self.ttl}
+
+def make_cache(backend: str = "memory", path: str = "cache.db",
+               maxsize: int = 256, ttl: float = 30):
+    """Returns cache of the given backend kind, "memory" or "sqlite"."""
+    if backend == "sqlite":
+        return SQLiteCache(path, maxsize, ttl)
+    if backend == "memory":
+        return TTLCache(maxsize, ttl)
+    raise ValueError(f"Unknown cache backend {backend}.")
@@ -2,12 +2,140 @@
 
 #pylint: disable=import-error disable=too-few-public-methods
 from os import getenv
+from time import perf_counter
+from contextlib import contextmanager
+from logging import getLogger
+from urllib.parse import quote
 from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Boolean
+from sqlalchemy import DateTime, Index, inspect, text, event, Engine
+from sqlalchemy.exc import OperationalError, IntegrityError
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from app.metrics import POOL_CHECKOUT_WAIT
 from flask_login import UserMixin
 
+logger = getLogger(__name__)
+
 DB_PATH = getenv('DB_PATH', 'prod.db')
-ENGINE = create_engine(f'sqlite:///{DB_PATH}', echo=True)
+#Engine settings, production defaults can be overridden through environment
+DB_ECHO = getenv('DB_ECHO', '0') == '1'
+DB_POOL_SIZE = int(getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(getenv('DB_POOL_TIMEOUT', '30'))
+#SQLite allows one writer at a time, queuing writers on a single pooled
+#connection avoids them spinning on "database is locked" inside SQLite
+DB_WRITE_POOL_SIZE = int(getenv('DB_WRITE_POOL_SIZE', '1'))
+#PRAGMA statements applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    #Readers do not block the writer and commits append to the log
+    'journal_mode': getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    #Durable across application crashes, fsync only on checkpoints in WAL mode
+    'synchronous': getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    #Page cache per connection, negative value is in KiB
+    'cache_size': getenv('SQLITE_CACHE_SIZE', '-65536'),
+    #Bytes of database file read through memory mapping
+    'mmap_size': getenv('SQLITE_MMAP_SIZE', '268435456'),
+    'temp_store': getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+    #Milliseconds to wait for a lock before raising "database is locked"
+    'busy_timeout': getenv('SQLITE_BUSY_TIMEOUT', '5000'),
+}
+
+def database_url(path: str, read_only: bool = False, driver: str = 'sqlite') -> str:
+    """Returns URL of SQLite database at path for the given driver
+    (e.g. sqlite+aiosqlite). Read-only URLs open the file with mode=ro."""
+    if read_only:
+        return f'{driver}:///file:{quote(path)}?mode=ro&uri=true'
+    return f'{driver}:///{path}'
+
+def connection_pragmas(pragmas: dict = None, read_only: bool = False) -> dict:
+    """Returns pragmas (SQLITE_PRAGMAS by default) to apply to each new connection.
+    Read-only connections refuse writes with query_only."""
+    pragmas = dict(SQLITE_PRAGMAS if pragmas is None else pragmas)
+    if read_only:
+        #Journal mode is a property of the file, set by the writer
+        pragmas.pop('journal_mode', None)
+        pragmas['query_only'] = 'ON'
+    return pragmas
+
+def set_pragmas_on_connect(engine: Engine, pragmas: dict, read_only: bool = False) -> None:
+    """Executes pragmas on each connection engine opens and lets SQLAlchemy
+    begin its transactions. The driver otherwise defers BEGIN to the first
+    write and commits on its own around SAVEPOINT, so rolling back an outer
+    transaction would not undo the nested ones. Writers begin IMMEDIATE,
+    waiting up to busy_timeout for the write lock, as a transaction that read
+    before another connection committed can no longer write."""
+    statement = 'BEGIN' if read_only else 'BEGIN IMMEDIATE'
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        #Stop the driver from emitting BEGIN and COMMIT itself
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin(conn):
+        #Through the driver, so statement events and counts only see queries
+        cursor = conn.connection.dbapi_connection.cursor()
+        cursor.execute(statement)
+        cursor.close()
+
+class TimedCheckout:
+    """Pool mixin observing how long each checkout waited for a connection
+    (including opening a new one) in POOL_CHECKOUT_WAIT, labeled by pool name."""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.labels(self.logging_name or "default"). \
+                observe(perf_counter() - start)
+
+class TimedQueuePool(TimedCheckout, QueuePool):
+    """QueuePool with timed checkouts."""
+
+class TimedAsyncAdaptedQueuePool(TimedCheckout, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool with timed checkouts."""
+
+def pool_name(read_only: bool, driver: str = 'sqlite') -> str:
+    """Returns name of engine pool reported in metrics, e.g. reader or async-writer."""
+    role = 'reader' if read_only else 'writer'
+    return role if driver == 'sqlite' else f'async-{role}'
+
+def create_db_engine(path: str, echo: bool = DB_ECHO, pragmas: dict = None,
+                     read_only: bool = False, pool_size: int = DB_POOL_SIZE,
+                     max_overflow: int = DB_MAX_OVERFLOW) -> Engine:
+    """Creates engine for SQLite database at path with a sized connection pool.
+    pragmas (SQLITE_PRAGMAS by default) are applied to each new connection.
+    Read-only engines open the file with mode=ro and refuse writes with query_only."""
+    engine = create_engine(database_url(path, read_only), echo=echo,
+                           poolclass=TimedQueuePool, pool_logging_name=pool_name(read_only),
+                           pool_size=pool_size, max_overflow=max_overflow,
+                           pool_timeout=DB_POOL_TIMEOUT)
+    set_pragmas_on_connect(engine, connection_pragmas(pragmas, read_only), read_only)
+    return engine
+
+def create_async_db_engine(path: str, echo: bool = DB_ECHO, pragmas: dict = None,
+                           read_only: bool = False, pool_size: int = DB_POOL_SIZE,
+                           max_overflow: int = DB_MAX_OVERFLOW) -> AsyncEngine:
+    """Creates asyncio engine for SQLite database at path over aiosqlite,
+    configured the same way as create_db_engine. Connections are pooled
+    (aiosqlite defaults to NullPool), so they belong to one event loop."""
+    engine = create_async_engine(database_url(path, read_only, 'sqlite+aiosqlite'), echo=echo,
+                                 poolclass=TimedAsyncAdaptedQueuePool,
+                                 pool_logging_name=pool_name(read_only, 'sqlite+aiosqlite'),
+                                 pool_size=pool_size, max_overflow=max_overflow,
+                                 pool_timeout=DB_POOL_TIMEOUT)
+    set_pragmas_on_connect(engine.sync_engine, connection_pragmas(pragmas, read_only),
+                           read_only)
+    return engine
+
+#Writer engine, also used for schema migrations
+ENGINE = create_db_engine(DB_PATH, pool_size=DB_WRITE_POOL_SIZE, max_overflow=0)
 
 #Declarative base
 class Base(DeclarativeBase):
@@ -24,6 +152,12 @@ class User(Base, UserMixin):
     password_hash = Column(String)
     admin = Column(Boolean, default=False)
 
+    __table_args__ = (
+        #Lookups by email and username on every login and registration
+        Index("ix_user_email", email, unique=True),
+        Index("ix_user_username", username, unique=True),
+    )
+
 # Defining the post table. This is the table that will store the blog posts.
 class Post(Base):
     """Post table."""
@@ -37,9 +171,112 @@ class Post(Base):
     content = Column(String)
     #Capitalized tag
     tag = Column(String(length=50))
-    #Post timestamp
+    #Post timestamp formatted for display
     timestamp = Column(String)
+    #Sortable post creation time used for ordering feeds
+    created_at = Column(DateTime)
     user_id = Column(Integer, ForeignKey('user.id'))
 
+    __table_args__ = (
+        #Newest-first index backing ORDER BY created_at DESC, id DESC in feed queries
+        Index("ix_post_created_at", created_at.desc(), id.desc()),
+        #Single author's feed in the same order, also covers ownership checks
+        Index("ix_post_user_id_created_at", user_id, created_at.desc(), id.desc()),
+    )
+
+def migrate(engine) -> None:
+    """Brings schema of an existing database up to date with the metadata.
+    Every step is idempotent, so it is safe to run on each startup."""
+    inspector = inspect(engine)
+    post_columns = [column["name"] for column in inspector.get_columns("post")]
+    with engine.begin() as conn:
+        if "created_at" not in post_columns:
+            conn.execute(text("ALTER TABLE post ADD COLUMN created_at DATETIME"))
+    #Create indexes missing on tables that existed before they were declared
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except IntegrityError:
+                #Unique index cannot be built while duplicates exist.
+                #Lookups keep working, just without the index.
+                logger.warning("Index %s not created, %s contains duplicate values.",
+                               index.name, table.name)
+    with engine.begin() as conn:
+        #Backfill from the "%m/%d/%Y, %H:%M" display string into the
+        #ISO format SQLAlchemy uses for DateTime columns on SQLite.
+        #Rows still missing created_at are found through ix_post_created_at.
+        conn.execute(text(
+            "UPDATE post SET created_at = "
+            "substr(timestamp, 7, 4) || '-' || substr(timestamp, 1, 2) || '-' || "
+            "substr(timestamp, 4, 2) || ' ' || substr(timestamp, 13, 5) || '\\:00.000000' "
+            "WHERE created_at IS NULL AND timestamp LIKE '__/__/____, __:__'"))
+
+#Triggers keeping post_fts in sync with post
+SEARCH_INDEX_TRIGGERS = {
+    "post_fts_insert":
+        "CREATE TRIGGER IF NOT EXISTS post_fts_insert AFTER INSERT ON post BEGIN "
+        "INSERT INTO post_fts (rowid, title, excerpt, tag, content) "
+        "VALUES (new.id, new.title, new.excerpt, new.tag, new.content); END",
+    "post_fts_delete":
+        "CREATE TRIGGER IF NOT EXISTS post_fts_delete AFTER DELETE ON post BEGIN "
+        "INSERT INTO post_fts (post_fts, rowid, title, excerpt, tag, content) "
+        "VALUES ('delete', old.id, old.title, old.excerpt, old.tag, old.content); END",
+    "post_fts_update":
+        "CREATE TRIGGER IF NOT EXISTS post_fts_update AFTER UPDATE ON post BEGIN "
+        "INSERT INTO post_fts (post_fts, rowid, title, excerpt, tag, content) "
+        "VALUES ('delete', old.id, old.title, old.excerpt, old.tag, old.content); "
+        "INSERT INTO post_fts (rowid, title, excerpt, tag, content) "
+        "VALUES (new.id, new.title, new.excerpt, new.tag, new.content); END",
+}
+
+def create_search_index(engine) -> bool:
+    """Creates FTS5 full-text index over post table and triggers keeping it in sync.
+    Missing triggers, e.g. left dropped by a killed deferred_search_index, are
+    recreated and the index rebuilt. Returns False if SQLite was compiled without
+    FTS5, in which case post filtering falls back to LIKE matching."""
+    try:
+        with engine.begin() as conn:
+            names = {name for name, in conn.execute(text("SELECT name FROM sqlite_master"))}
+            if "post_fts" not in names:
+                #External content table stores only the index, text stays in post
+                conn.execute(text("CREATE VIRTUAL TABLE post_fts USING fts5("
+                                  "title, excerpt, tag, content, "
+                                  "content='post', content_rowid='id')"))
+            for trigger in SEARCH_INDEX_TRIGGERS.values():
+                conn.execute(text(trigger))
+            if "post_fts" not in names or not names.issuperset(SEARCH_INDEX_TRIGGERS):
+                #Index posts written before the index or while it was out of sync
+                conn.execute(text("INSERT INTO post_fts (post_fts) VALUES ('rebuild')"))
+    except OperationalError:
+        #no such module: fts5
+        return False
+    return True
+
+@contextmanager
+def deferred_search_index(engine):
+    """Suspends search index triggers while bulk loading posts
+    and rebuilds the whole index once afterwards, which is several times
+    faster than indexing row by row. Does nothing without post_fts."""
+    with engine.begin() as conn:
+        triggers = [name for name, in conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+                    if name in SEARCH_INDEX_TRIGGERS]
+        for name in triggers:
+            conn.execute(text(f"DROP TRIGGER {name}"))
+    try:
+        yield
+    finally:
+        if triggers:
+            with engine.begin() as conn:
+                for name in triggers:
+                    conn.execute(text(SEARCH_INDEX_TRIGGERS[name]))
+                conn.execute(text("INSERT INTO post_fts (post_fts) VALUES ('rebuild')"))
+
 # Emitting the schema to the database
 Base.metadata.create_all(ENGINE)
+migrate(ENGINE)
+#Full-text search is optional, filter_posts falls back to LIKE without it
+FTS_ENABLED = create_search_index(ENGINE)
+#Read-only engine serving queries of request sessions, see app.routing
+READ_ENGINE = create_db_engine(DB_PATH, read_only=True)
@@ -2,16 +2,21 @@
 support various parts of the application."""
 
 #pylint: disable=import-error
+from os import getenv
+from hmac import compare_digest
 from functools import wraps
-from flask import render_template, redirect
+from flask import redirect, url_for, abort, current_app, request
 from flask_login import current_user
 from flask_login.utils import login_required as login_required_flask_login
-from app.models import get_users
+
+#Bearer token letting monitoring clients that cannot log in (e.g. a Prometheus
+#scraper) read monitoring endpoints, unset by default
+MONITORING_TOKEN = getenv("MONITORING_TOKEN")
 
 def login_required(view_func):
     """Custom version of login_required that checks if user is admin
     and handles the request accordingly. If admin is logged in,
-    the admin version of website is returned."""
+    they are redirected to the admin version of website."""
     @wraps(view_func)
     def wrapper(*args, **kwargs):
         if current_user.is_authenticated and current_user.admin:
@@ -19,15 +24,39 @@ def login_required(view_func):
             if view_func.__name__ != "logout":
                 #Does not apply to logout view function because A
                 #admin must be able to logout.
-                #Fetch all users form the database.
-                users = get_users()
-                return render_template("admin_page.html", users=users)
+                return redirect(url_for("admin.users"))
 
         #Wrap view function with login_required by flask_login
         return login_required_flask_login(view_func)(*args, **kwargs)
 
     return wrapper
 
+def admin_required(view_func):
+    """View function wrapper that only lets admins in. Anonymous clients
+    are sent to login page, other users get 404."""
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return current_app.login_manager.unauthorized()
+        if not current_user.admin:
+            abort(404)
+        return view_func(*args, **kwargs)
+    return wrapper
+
+def monitoring_required(view_func):
+    """View function wrapper that only lets in admins and clients sending
+    "Authorization: Bearer <MONITORING_TOKEN>", others get 404. The client
+    address is not trusted: behind a local reverse proxy every client is local."""
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        token = request.authorization.token if request.authorization else None
+        if MONITORING_TOKEN and token and compare_digest(token, MONITORING_TOKEN):
+            return view_func(*args, **kwargs)
+        if not (current_user.is_authenticated and current_user.admin):
+            abort(404)
+        return view_func(*args, **kwargs)
+    return wrapper
+
 def already_logged_in(view_func):
     """View function wrapper that redirects client to home page if already 
     authenticated."""
@@ -12,11 +12,14 @@ def verify_email_in_use(form, email):
         raise ValidationError(f"Email {email.data} already in-use.")
 
 def check_credentials(form, email):
-    """Custom field validator that check if email and password are valid."""
-    user_id = validate_user(email.data, form.password.data)
-    if not user_id:
+    """Custom field validator that check if email and password are valid.
+    Authenticated user is stored on form.user, so the view can log them in
+    without validating credentials a second time."""
+    user = validate_user(email.data, form.password.data)
+    if not user:
         #User with given credentials does not exist, raise a validation error
         raise ValidationError("Invalid email or password.")
+    form.user = user
 
 def verify_username_in_use(form, username):
     """Custom field validator that check if username is already in-use."""
@@ -26,6 +29,8 @@ def verify_username_in_use(form, username):
 
 class LoginForm(Form):
     """Login form."""
+    #User authenticated by check_credentials during validation
+    user = None
     email = EmailField('Email', [validators.Length(min=4, max=50),
                                  check_credentials])
     password = PasswordField('Password', [validators.Length(min=4, max=35,
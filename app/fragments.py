@@ -0,0 +1,47 @@
+"""This module implements a Jinja extension caching rendered template fragments.
+
+    {% cache "card", post.id %} ...markup of the post card... {% endcache %}
+
+renders the block once and serves later renders from the cache assigned to
+environment.fragment_cache, under the key returned by fragment_key for the
+tag's arguments. Fragments must only depend on their key: markup of a post
+is cached by post id and dropped when the post is deleted, see app.models."""
+
+#pylint: disable=import-error
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+def fragment_key(*parts) -> str:
+    """Returns cache key of the fragment identified by parts."""
+    return ":".join(["fragment"] + [str(part) for part in parts])
+
+class FragmentCacheExtension(Extension):
+    """Adds the {% cache key, ... %}...{% endcache %} tag."""
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        #Without a cache, fragments are rendered every time
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render", [nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, parts: list, caller) -> Markup:
+        """Returns cached markup of the fragment, rendering it on a miss."""
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = fragment_key(*parts)
+        markup = cache.get(key)
+        if markup is None:
+            markup = str(caller())
+            cache.set(key, markup)
+        return Markup(markup)
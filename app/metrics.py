@@ -0,0 +1,68 @@
+"""This module defines Prometheus metrics of the application and the /metrics view.
+
+Collectors come from prometheus_client: each update takes a per-metric lock only.
+When several worker processes serve the app, point PROMETHEUS_MULTIPROC_DIR at
+a directory shared by them (and emptied before they start), each process then
+writes its values to its own memory-mapped file and /metrics merges them."""
+
+#pylint: disable=import-error
+import os
+from time import perf_counter
+from flask import g, request
+from prometheus_client import Counter, Histogram, CollectorRegistry, generate_latest
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client.multiprocess import MultiProcessCollector
+
+REQUESTS = Counter("blog_requests_total", "HTTP requests served.",
+                   ["endpoint", "method", "status"])
+REQUEST_DURATION = Histogram("blog_request_duration_seconds",
+                             "Time spent serving HTTP requests.", ["endpoint"])
+POOL_CHECKOUT_WAIT = Histogram("blog_db_pool_checkout_wait_seconds",
+                               "Time spent waiting for a pooled database connection.",
+                               ["pool"], buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05,
+                                                  0.1, 0.5, 1, 5, 30))
+CACHE_LOOKUPS = Counter("blog_cache_lookups_total",
+                        "Cache lookups by key kind (feed, post, user) and result.",
+                        ["kind", "result"])
+PASSWORD_HASH_DURATION = Histogram("blog_password_hash_seconds",
+                                   "Time spent hashing and verifying passwords.",
+                                   ["operation"], buckets=(0.005, 0.01, 0.025, 0.05, 0.1,
+                                                           0.25, 0.5, 1, 2.5))
+WRITE_QUEUE_BATCH_SIZE = Histogram("blog_write_queue_batch_size",
+                                   "Rows inserted per group commit of the write queue.",
+                                   buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
+def instrument_cache(cache) -> None:
+    """Counts hits and misses of cache lookups by the first part of their keys."""
+    get = cache.get
+    missing = object()
+
+    def counted_get(key, default=None):
+        value = get(key, missing)
+        CACHE_LOOKUPS.labels(str(key).split(":", 1)[0],
+                             "miss" if value is missing else "hit").inc()
+        return default if value is missing else value
+
+    cache.get = counted_get
+
+def start_timer():
+    """Marks start of a request."""
+    g.metrics_started = perf_counter()
+
+def record_request(response):
+    """Counts finished request and observes its duration."""
+    endpoint = request.endpoint or "<unmatched>"
+    REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    if "metrics_started" in g:
+        REQUEST_DURATION.labels(endpoint).observe(perf_counter() - g.metrics_started)
+    return response
+
+def exposition() -> tuple[bytes, str]:
+    """Returns current metrics of all worker processes in text exposition format
+    along with its content type."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
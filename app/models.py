@@ -1,182 +1,460 @@
 """This module defines the database models for the application."""
 
 #pylint: disable=import-error
+import atexit
+from os import getenv
+from time import perf_counter, time
 from datetime import datetime as dt
-from flask import g
-from sqlalchemy.orm import Session
-from sqlalchemy import select, delete
-from app.dbschema import User, Post, ENGINE
-from app.util import password_hash
+from dataclasses import dataclass
+from collections.abc import Iterator
+from contextlib import contextmanager
+from flask import g, has_app_context
+from flask.globals import app_ctx
+from flask_login import UserMixin
+from sqlalchemy import select, delete, tuple_, text, column, Integer, Row, event
+from sqlalchemy import func, or_, and_, insert
+from sqlalchemy.orm import scoped_session, sessionmaker
+from app.dbschema import User, Post, ENGINE, READ_ENGINE, FTS_ENABLED
+from app.routing import Router, RoutingSession
+from app.util import password_hash, verify_password, needs_rehash, run_in_hash_pool
+from app.util import fts_phrase
+from app.cache import make_cache
+from app.metrics import instrument_cache
+from app.fragments import fragment_key
+from app.write_queue import WriteQueue, WRITE_QUEUE
+
+#Number of posts shown on a single feed page
+PAGE_SIZE = 100
+#Rows fetched at a time by streamed listings, see stream_rows
+STREAM_BATCH_SIZE = 20
+#Columns rendered on feed cards. Selecting them instead of whole Post entities
+#skips loading content and hydrating ORM objects for every listed post.
+POST_SUMMARY = (Post.id, Post.title, Post.excerpt, Post.tag,
+                Post.timestamp, Post.created_at, User.username)
+#Cache of feed pages (and their rendered cards, see app.app.index) and posts.
+#Feed keys embed "feed" generation bumped by add_post and delete_post.
+#Use CACHE_BACKEND=sqlite when running several worker processes.
+CACHE = make_cache(getenv("CACHE_BACKEND", "memory"),
+                   getenv("CACHE_PATH", "cache.db"),
+                   maxsize=int(getenv("CACHE_SIZE", "256")),
+                   ttl=float(getenv("CACHE_TTL", "30")))
+#Rendered template fragments, see app.fragments. Kept apart from CACHE, so
+#a page of cards does not evict feed pages, and for longer since fragments
+#of a post never change until it is deleted.
+FRAGMENTS = make_cache(getenv("CACHE_BACKEND", "memory"),
+                       getenv("FRAGMENT_CACHE_PATH", "fragments.db"),
+                       maxsize=int(getenv("FRAGMENT_CACHE_SIZE", "4096")),
+                       ttl=float(getenv("FRAGMENT_CACHE_TTL", "600")))
+#Fragments rendered for every post, by name. Keys also carry created_at, as
+#new posts may reuse rowids of deleted ones, so a fragment never outlives its
+#post in other processes and dropping it in forget_post only saves memory.
+POST_FRAGMENTS = ("card", "own_card", "post")
+#Count hits and misses by key kind for /metrics
+instrument_cache(CACHE)
+instrument_cache(FRAGMENTS)
+
+#Writer thread group-committing new posts, see app.write_queue. Cached feed
+#pages no longer include the newest posts once a group is committed.
+POST_QUEUE = WriteQueue(ENGINE, Post, on_commit=lambda: CACHE.bump("feed")) \
+             if WRITE_QUEUE else None
+if POST_QUEUE:
+    #Commit posts still queued when the process exits
+    atexit.register(POST_QUEUE.close)
+
+#Request sessions read through READ_ENGINE and write through ENGINE.
+#Swap for Router(primary, [replica, ...]) engines to run on Postgres.
+ROUTER = Router(ENGINE, [READ_ENGINE])
+#Hash checked when login email is unknown
+DUMMY_HASH = password_hash("")
+#Lifetime of cached users returned by load_user, kept short because
+#changes made to the user table outside of this module are not invalidated
+USER_CACHE_TTL = float(getenv("USER_CACHE_TTL", "10"))
+
+@dataclass(frozen=True)
+class UserRecord(UserMixin):
+    """Detached read-only copy of a User row used as flask-login current_user.
+    Safe to cache and share between requests, carries no password hash."""
+    id: int
+    email: str
+    username: str
+    admin: bool
+
+def post_key(post_id) -> str | None:
+    """Returns cache key of a single post, or None if post_id is not a valid id."""
+    post_id = str(post_id)
+    return f"post:{int(post_id)}" if post_id.isdigit() else None
+
+def feed_key(*parts) -> str:
+    """Returns cache key of a feed entry valid until the next post write."""
+    return ":".join(["feed", str(CACHE.generation("feed"))] + [str(part) for part in parts])
+
+def feed_version() -> str | None:
+    """Returns version of the feed, which changes with every post write.
+    Unless CACHE is shared, writes of other processes (workers, flask posts
+    import) do not bump it, so the version also changes every CACHE_TTL
+    seconds, as often as cached feed pages expire. None without caching."""
+    version = f"{CACHE.epoch}.{CACHE.generation('feed')}"
+    if CACHE.shared:
+        return version
+    if CACHE.ttl <= 0:
+        return None
+    return f"{version}.{int(time() // CACHE.ttl)}"
+
+def app_context_id() -> int:
+    """Identifies current application context, which scopes SESSION."""
+    #pylint: disable=protected-access
+    return id(app_ctx._get_current_object())
+
+#One session per application context (i.e. per request), created on first use.
+#Objects stay loaded after commit, so model functions can end their
+#transaction and give the connection back to the pool right away.
+SESSION = scoped_session(sessionmaker(class_=RoutingSession, router=ROUTER,
+                                      expire_on_commit=False),
+                         scopefunc=app_context_id)
+
+def track_connection_time(engine) -> None:
+    """Adds time connections of engine spend checked out of the pool
+    to g.db_connection_time of the current request."""
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None and has_app_context():
+            g.db_connection_time = g.get("db_connection_time", 0) + \
+                                   perf_counter() - checked_out_at
+
+for routed_engine in {ROUTER.writer, *ROUTER.readers}:
+    track_connection_time(routed_engine)
 
 def get_session():
-    """Returns a session object."""
-    if not hasattr(g, "db_session"):
-        setattr(g, "db_session", Session(ENGINE))
-        return g.db_session
-    return g.db_session
+    """Returns session of the current request.
+    Connection is not checked out until the first statement is executed."""
+    return SESSION()
+
+@contextmanager
+def unit_of_work():
+    """Yields request session inside a transaction.
+    Outermost unit commits on success and rolls back on error, nested units
+    included, which also returns its connection to the pool. Nested units run
+    in a SAVEPOINT, so a failed step of a multi-step write is undone without
+    losing the rest."""
+    session = get_session()
+    depth = session.info.get("unit_of_work_depth", 0)
+    session.info["unit_of_work_depth"] = depth + 1
+    try:
+        if depth:
+            with session.begin_nested():
+                yield session
+        else:
+            try:
+                yield session
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+    finally:
+        session.info["unit_of_work_depth"] = depth
 
 def validate_user(email: str, password: str) -> User | None:
     """Validates user credentials.
-    Returns User instance if user exists, otherwise returns None."""
-    #Get session object
-    session = get_session()
-    #Generate password hash
-    pswd_hash = password_hash(password)
-    #Instantiate User object
-    user = User(email=email, password_hash=pswd_hash)
-    #Get this user from database
-    user = session.execute(select(User).where(User.email == user.email).
-                           where(User.password_hash == pswd_hash)).scalar_one_or_none()
-    #Return user if user exists, otherwise return None
-    return user if user else None
-
-def load_user(user_id: str) -> User | None:
-    """Loads user from database by id."""
-    #Get session object
-    session = get_session()
-    #Get user from database
-    user = session.get(User, int(user_id))
-    #Return user
+    Returns User instance if user exists, otherwise returns None.
+    Hash of a user with outdated algorithm or cost is upgraded on success."""
+    with unit_of_work() as session:
+        #Get user from database
+        user = session.execute(select(User).where(User.email == email)).scalar_one_or_none()
+    #Hash is verified after the connection is returned, so logins waiting
+    #for the hash pool do not hold connections.
+    #Verify against a dummy hash for unknown emails, so response time
+    #does not reveal which emails are registered
+    stored_hash = user.password_hash if user else DUMMY_HASH
+    if not run_in_hash_pool(verify_password, password, stored_hash) or not user:
+        return None
+    if needs_rehash(stored_hash):
+        upgraded_hash = run_in_hash_pool(password_hash, password)
+        with unit_of_work():
+            user.password_hash = upgraded_hash
+    #Return authenticated user
     return user
 
+def load_user(user_id: str) -> UserRecord | None:
+    """Loads user by id, from CACHE when possible, otherwise from database."""
+    key = f"user:{int(user_id)}"
+    record = CACHE.get(key)
+    if record is not None:
+        return record
+    with unit_of_work() as session:
+        #Get user from database
+        user = session.get(User, int(user_id))
+    if user is None:
+        return None
+    record = UserRecord(user.id, user.email, user.username, bool(user.admin))
+    CACHE.set(key, record, ttl=USER_CACHE_TTL)
+    #Return user
+    return record
+
+def forget_user(user_id: int) -> None:
+    """Drops cached copy of user, must be called after the user row changes."""
+    CACHE.delete(f"user:{int(user_id)}")
+
 def add_user(email:str, username: str, password:str, admin=False) -> User:
     """Adds user to database."""
-    #Get session object
-    session = get_session()
     #Generate password hash
-    pswd_hash = password_hash(password)
+    pswd_hash = run_in_hash_pool(password_hash, password)
     #Instantiate User object
     user = User(email=email.lower(),
                 username = username.lower(),
                 password_hash=pswd_hash, admin=admin)
-    #Add user to session
-    session.add(user)
-    session.flush()
-    session.commit()
+    with unit_of_work() as session:
+        #Add user to session
+        session.add(user)
+        session.flush()
     # Return User instance of newly inserted user
     return user
 
 def check_email_exists(email: str) -> bool:
     """Checks if user with given email already exists in the database."""
-    #Get session object
-    session = get_session()
-    #Get user from database
-    user = session.execute(select(User).where(User.email == email)).scalar_one_or_none()
+    with unit_of_work() as session:
+        #Get user from database
+        user = session.execute(select(User).where(User.email == email)).scalar_one_or_none()
     #Return True if user exists, otherwise return False
     return bool(user)
 
 def check_username_exists(username: str) -> bool:
     """Checks if user with given username already exists in the database."""
-    #Get session object
-    session = get_session()
-    #Get user from database
-    user = session.execute(select(User).where(User.username == username)).scalar_one_or_none()
+    with unit_of_work() as session:
+        #Get user from database
+        user = session.execute(select(User).where(User.username == username)). \
+                    scalar_one_or_none()
     #Return True if user exists, otherwise return False
     return bool(user)
 
-def add_post(title: str, excerpt: str, content: str, tag: str, user_id: int) -> int:
-    """Adds post to database."""
+def post_values(title: str, excerpt: str, content: str, tag: str, user_id: int,
+                created_at: dt = None) -> dict:
+    """Returns column values of a new post, created now unless created_at is given."""
     #Capitalize tag
     tag = tag.capitalize()
-    #Get current unix timestamp
-    timestamp = dt.now().strftime("%m/%d/%Y, %H:%M")
-    #Get session object
+    #Get current time and its display representation
+    created_at = created_at or dt.now()
+    timestamp = created_at.strftime("%m/%d/%Y, %H:%M")
+    return {"title": title, "excerpt": excerpt, "content": content, "tag": tag,
+            "timestamp": timestamp, "created_at": created_at, "user_id": user_id}
+
+def new_post(title: str, excerpt: str, content: str, tag: str, user_id: int) -> Post:
+    """Returns Post created now, ready to be added to a session."""
+    return Post(**post_values(title, excerpt, content, tag, user_id))
+
+def add_post(title: str, excerpt: str, content: str, tag: str, user_id: int) -> int:
+    """Adds post to database. With WRITE_QUEUE=1 the post is committed along
+    with others by POST_QUEUE, unless the caller's unit of work or transaction
+    is open: the post then joins it, as waiting on the queue could hold the
+    connection the queue needs."""
     session = get_session()
-    #Instantiate Post object
-    post = Post(title=title, excerpt=excerpt,
-                content=content, tag=tag,
-                timestamp=timestamp, user_id=user_id)
-    #Add post to session
-    session.add(post)
-    session.flush()
-    post_id = post.id
-    session.commit()
+    if POST_QUEUE and not (session.info.get("unit_of_work_depth") or
+                           session.in_transaction()):
+        return POST_QUEUE.submit(post_values(title, excerpt, content, tag, user_id)).result()
+    post = new_post(title, excerpt, content, tag, user_id)
+    with unit_of_work() as session:
+        #Add post to session
+        session.add(post)
+        session.flush()
+        post_id = post.id
+    #Cached feed pages no longer include the newest post
+    CACHE.bump("feed")
     # Return post_id of newly inserted post
     return post_id
 
-def get_posts(limit=100, offset=0) -> list[Post]:
-    """Fetches at most 100 posts from the database."""
-    #Get session object
-    session = get_session()
-    posts = session.execute(select(Post, User.username).
-                    limit(limit).
-                    offset(offset).
-                    join_from(Post, User, Post.user_id == User.id).
-                    order_by(Post.timestamp.desc()))
-    posts = posts.all()
+def add_posts(rows: list[dict]) -> int:
+    """Adds posts given as post_values in a single transaction, executing one
+    INSERT for all of them. Returns number of added posts."""
+    if not rows:
+        return 0
+    with unit_of_work() as session:
+        session.execute(insert(Post), rows)
+    CACHE.bump("feed")
+    return len(rows)
+
+def get_user_ids(usernames) -> dict[str, int]:
+    """Returns ids of existing users among usernames, by username."""
+    with unit_of_work() as session:
+        users = session.execute(select(User.username, User.id).
+                                where(User.username.in_(list(usernames))))
+        return dict(users.all())
+
+def stream_all_posts() -> Iterator[Row]:
+    """Yields every post along with author's username in the order posts were
+    added, fetched while they are consumed, see stream_rows."""
+    stmt = select(Post.id, Post.title, Post.excerpt, Post.content, Post.tag,
+                  Post.created_at, User.username). \
+        join_from(Post, User, Post.user_id == User.id).order_by(Post.id)
+    return stream_rows(stmt)
+
+def paginate(stmt, limit: int, after: tuple | None):
+    """Orders post query newest first and restricts it to a single page.
+    after is (created_at, post_id) of the last post on the previous page.
+    Seeking past it through the feed index costs the same on every page,
+    unlike OFFSET which has to walk over all preceding rows."""
+    if after:
+        stmt = stmt.where(tuple_(Post.created_at, Post.id) < tuple_(*after))
+    return stmt.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit)
+
+def summary_query(tag: str = None, username: str = None, title: str = None):
+    """Returns query of post summaries matching filter criteria, not yet paginated.
+    Shared by model functions here and in app.async_models."""
+    #Build select query
+    stmt = select(*POST_SUMMARY)
+    #Add additional state onto query object if tag, username, or title is not None.
+    #Tag and title are looked up in post_fts full-text index when available,
+    #LIKE with leading wildcard cannot use an index and scans every post.
+    search = []
+    for field, term in ((Post.tag, tag), (Post.title, title)):
+        if not term:
+            continue
+        phrase = fts_phrase(term) if FTS_ENABLED else None
+        if phrase:
+            search.append(f"{field.name} : {phrase}")
+        else:
+            stmt = stmt.where(field.like(f"%{term}%"))
+    if search:
+        matches = text("SELECT rowid FROM post_fts WHERE post_fts MATCH :query"). \
+                    bindparams(query=" AND ".join(search)). \
+                    columns(column("rowid", Integer))
+        stmt = stmt.where(Post.id.in_(matches))
+    if username:
+        stmt = stmt.where(User.username.like(f"%{username}%"))
+
+    #Add additional constraints to query object
+    return stmt.join_from(Post, User, Post.user_id == User.id)
+
+def post_query(post_id):
+    """Returns query of a single post along with its author's username."""
+    return select(Post, User.username). \
+                where(Post.id == post_id). \
+                join_from(Post, User, Post.user_id == User.id)
+
+def get_posts(limit: int = PAGE_SIZE, after: tuple = None) -> list[Row]:
+    """Fetches a page of at most 100 post summaries from the database.
+    Pages are served from CACHE when possible."""
+    key = feed_key("posts", limit, after)
+    posts = CACHE.get(key)
+    if posts is None:
+        with unit_of_work() as session:
+            posts = session.execute(paginate(summary_query(), limit, after)).all()
+        CACHE.set(key, posts)
     return posts
 
 def get_post(post_id: str) -> Post:
     """Fetches single post form the database identified by post_id"""
-    #Get session object
-    session = get_session()
-    post = session.execute(select(Post, User.username).
-                    where(Post.id == post_id).
-                    join_from(Post, User, Post.user_id == User.id))
-    #Fetch post and return Post object
-    post = post.first()
+    key = post_key(post_id)
+    post = CACHE.get(key) if key else None
+    if post is not None:
+        return post
+    with unit_of_work() as session:
+        #Fetch post and return Post object
+        post = session.execute(post_query(post_id)).first()
+        if post is not None and key:
+            #Detach post so the cached copy is not expired by later commits
+            session.expunge(post[0])
+    if post is not None and key:
+        CACHE.set(key, post)
 
     return post
 
+def post_modified(post_id: str) -> dt | None:
+    """Returns when post was last modified, which is when it was created as
+    posts are never edited, or None if there is no such post. Reads the cached
+    post if there is one, otherwise only the timestamp."""
+    key = post_key(post_id)
+    if key is None:
+        return None
+    post = CACHE.get(key)
+    if post is not None:
+        return post[0].created_at
+    with unit_of_work() as session:
+        return session.execute(select(Post.created_at).
+                               where(Post.id == int(post_id))).scalar()
+
 def get_users() -> list[User]:
     """Fetches all users from the database."""
-    #Get session object
-    session = get_session()
-    #Pylint complains about using == with None, but this is the correct way to do it
-    #pylint: disable=singleton-comparison
-    users = session.execute(select(User).where(User.admin == False))
-    #Fetch users and return list of User objects
-    users = users.all()
+    with unit_of_work() as session:
+        #Pylint complains about using == with None, but this is the correct way to do it
+        #pylint: disable=singleton-comparison
+        users = session.execute(select(User).where(User.admin == False))
+        #Fetch users and return list of User objects
+        users = users.all()
 
     return users
 
-def filter_posts(tag: str = None, username: str = None, title: str = None,
-                 limit: int = 100, offset: int = 0) -> list[Post]:
-    """Filters posts by tag, username, and title."""
-    #Get session object
-    session = get_session()
-    #Get posts from database
-    #Build select query
-    stmt = select(Post, User.username)
-    #Add additional state onto query object if tag, username, or title is not None
-    if tag:
-        stmt = stmt.where(Post.tag.like(f"%{tag}%"))
-    if username:
-        stmt = stmt.where(User.username.like(f"%{username}%"))
-    if title:
-        stmt = stmt.where(Post.title.like(f"%{title}%"))
+def stream_rows(stmt) -> Iterator[Row]:
+    """Yields rows of stmt fetched STREAM_BATCH_SIZE at a time while they are
+    consumed, e.g. by a streamed template. The unit of work, and with it the
+    connection, lasts until the iterator is exhausted or closed."""
+    with unit_of_work() as session:
+        yield from session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
 
-    #Add additional constraints to query object
-    stmt = stmt.join_from(Post, User, Post.user_id == User.id) \
-                                .limit(limit).offset(offset) \
-                                .order_by(Post.timestamp.desc())
-    #Execute query
-    posts = session.execute(stmt)
-    #Fetch posts and return list of Post objects
-    posts = posts.all()
+def fetch_rows(stmt, stream: bool = False) -> list[Row] | Iterator[Row]:
+    """Returns rows of listing query stmt, as an iterator of stream_rows with stream."""
+    if stream:
+        return stream_rows(stmt)
+    with unit_of_work() as session:
+        return session.execute(stmt).all()
 
-    return posts
+def get_user_page(search: str = None, limit: int = PAGE_SIZE, after: int = None,
+                  stream: bool = False) -> list[Row] | Iterator[Row]:
+    """Fetches a page of non-admin users ordered by id, starting after user id after.
+    search keeps users whose username or email starts with it, in any case. Rows
+    carry id, username, email and number of posts, counted for the page's users only.
+    With stream, rows are fetched while they are consumed, see stream_rows."""
+    stmt = select(User.id, User.username, User.email).where(User.admin.is_(False))
+    if search:
+        #Usernames and emails are stored lowercase, see add_user
+        search = search.lower()
+        #Prefix ranges, unlike LIKE, are looked up in the unique indexes
+        stmt = stmt.where(or_(*(and_(column >= search, column < search + "\uffff")
+                                for column in (User.username, User.email))))
+    if after:
+        stmt = stmt.where(User.id > after)
+    page = stmt.order_by(User.id).limit(limit).subquery()
+    #Single aggregate over posts of the page through ix_post_user_id_created_at
+    stmt = select(page, func.count(Post.id).label("posts")). \
+        outerjoin(Post, Post.user_id == page.c.id). \
+        group_by(page.c.id).order_by(page.c.id)
+    return fetch_rows(stmt, stream)
 
-def get_user_posts(user_id: int, limit: int = 100, offset: int = 0) -> list[Post]:
-    """Fetches posts from the database created by user_id."""
-    #Get session object
-    session = get_session()
-    #Get posts from database
-    posts = session.execute(select(Post, User.username).
-                    where(Post.user_id == user_id).
-                    join_from(Post, User, Post.user_id == User.id).
-                    limit(limit).
-                    offset(offset).
-                    order_by(Post.timestamp.desc()))
-    #Fetch posts and return list of Post objects
-    posts = posts.all()
+def filter_posts(tag: str = None, username: str = None, title: str = None,
+                 limit: int = PAGE_SIZE, after: tuple = None,
+                 stream: bool = False) -> list[Row] | Iterator[Row]:
+    """Filters posts by tag, username, and title. Returns post summaries,
+    fetched while they are consumed with stream."""
+    stmt = summary_query(tag, username, title)
+    return fetch_rows(paginate(stmt, limit, after), stream)
 
-    return posts
+def get_user_posts(user_id: int, limit: int = PAGE_SIZE, after: tuple = None,
+                   stream: bool = False) -> list[Row] | Iterator[Row]:
+    """Fetches summaries of posts from the database created by user_id,
+    fetched while they are consumed with stream."""
+    #Get posts from database
+    stmt = summary_query().where(Post.user_id == user_id)
+    return fetch_rows(paginate(stmt, limit, after), stream)
 
 def delete_post(post_id: int, user_id: id) -> None:
     """Deletes post from database."""
-    #Get session object
-    session = get_session()
-    #Only deletes post if logged in user owns the post
-    session.execute(delete(Post).where(Post.id == post_id).where(Post.user_id == user_id))
-    session.commit()
+    with unit_of_work() as session:
+        #Only deletes post if logged in user owns the post
+        deleted = session.execute(delete(Post).where(Post.id == post_id).
+                                  where(Post.user_id == user_id).
+                                  returning(Post.id, Post.created_at)).first()
+    if deleted:
+        forget_post(*deleted)
+
+def forget_post(post_id: int, created_at: dt = None) -> None:
+    """Drops cached copies of a deleted post and, given its created_at,
+    rendered fragments of the post."""
+    #Deleted post may be on any cached feed page
+    CACHE.bump("feed")
+    CACHE.delete(post_key(post_id))
+    if created_at:
+        for name in POST_FRAGMENTS:
+            FRAGMENTS.delete(fragment_key(name, post_id, created_at))
@@ -0,0 +1,193 @@
+"""This module implements opt-in per-request profiling, enabled with PROFILING=1.
+
+For every request it records the number of SQL statements, time spent executing
+them, ORM time (the rest of database transactions: compiling statements,
+fetching and hydrating rows), template render time and the slowest statement.
+Timings are sent in a Server-Timing header and aggregated per route for the
+admin-only /admin/profile endpoint. A PROFILE_SAMPLE_RATE fraction of requests
+is also run under cProfile, with stats written to PROFILE_DIR."""
+
+#pylint: disable=import-error disable=unused-argument
+import os
+import cProfile
+from random import random
+from threading import Lock
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime as dt
+from time import perf_counter
+from flask import g, request, jsonify, abort, has_app_context
+from flask import before_render_template, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from app.routing import RoutingSession
+
+PROFILING = os.getenv("PROFILING", "0") == "1"
+#Fraction of requests captured with cProfile
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+#Latest requests of each route kept for percentiles
+PROFILE_WINDOW = int(os.getenv("PROFILE_WINDOW", "1000"))
+
+@dataclass
+class RequestProfile:
+    """Timings of a single request, in seconds."""
+    started: float = field(default_factory=perf_counter)
+    total: float = 0
+    statements: int = 0
+    sql: float = 0
+    transactions: float = 0
+    render: float = 0
+    slowest_sql: float = 0
+    slowest_statement: str = None
+
+    @property
+    def orm(self) -> float:
+        """Time of database transactions not spent executing statements."""
+        return max(self.transactions - self.sql, 0)
+
+class RouteStats:
+    """Profiles of the latest PROFILE_WINDOW requests of each route."""
+
+    def __init__(self, window: int = PROFILE_WINDOW):
+        self.window = window
+        self.profiles = {}
+        self.captures = deque(maxlen=100)
+        self._lock = Lock()
+
+    def add(self, route: str, profile: RequestProfile) -> None:
+        """Records profile of a finished request to route."""
+        with self._lock:
+            self.profiles.setdefault(route, deque(maxlen=self.window)).append(profile)
+
+    def summary(self) -> dict:
+        """Returns p50/p95/p99 of each timing in milliseconds, by route,
+        along with the slowest statement seen on the route."""
+        with self._lock:
+            routes = {route: list(profiles) for route, profiles in self.profiles.items()}
+            captures = list(self.captures)
+        summary = {}
+        for route, profiles in routes.items():
+            slowest = max(profiles, key=lambda profile: profile.slowest_sql)
+            summary[route] = {
+                "requests": len(profiles),
+                **{name: percentiles([getattr(profile, name) * 1000 for profile in profiles])
+                   for name in ("total", "sql", "orm", "render")},
+                "statements": percentiles([profile.statements for profile in profiles]),
+                "slowest_statement": {"sql": slowest.slowest_statement,
+                                      "ms": round(slowest.slowest_sql * 1000, 3)},
+            }
+        return {"routes": summary, "captures": captures}
+
+def percentiles(values: list[float]) -> dict:
+    """Returns 50th, 95th and 99th percentile of values (nearest rank)."""
+    values = sorted(values)
+    return {f"p{rank}": round(values[min(len(values) * rank // 100, len(values) - 1)], 3)
+            for rank in (50, 95, 99)}
+
+STATS = RouteStats()
+
+def current_profile() -> RequestProfile | None:
+    """Returns profile of the current request, None when it is not profiled."""
+    return g.get("profile") if has_app_context() else None
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Marks start of a statement executed for a profiled request."""
+    if current_profile():
+        conn.info.setdefault("profile_query_start", []).append(perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Adds executed statement to the request profile."""
+    profile = current_profile()
+    starts = conn.info.get("profile_query_start")
+    if profile and starts:
+        elapsed = perf_counter() - starts.pop()
+        profile.statements += 1
+        profile.sql += elapsed
+        if elapsed > profile.slowest_sql:
+            profile.slowest_sql = elapsed
+            profile.slowest_statement = statement
+
+def transaction_began(session, transaction, connection):
+    """Marks start of a session transaction of a profiled request."""
+    if current_profile():
+        session.info.setdefault("profile_transaction_start", perf_counter())
+
+def transaction_ended(session, transaction):
+    """Adds length of a finished session transaction to the request profile."""
+    profile = current_profile()
+    if transaction.parent is None and "profile_transaction_start" in session.info:
+        started = session.info.pop("profile_transaction_start")
+        if profile:
+            profile.transactions += perf_counter() - started
+
+def listen_once(target, identifier: str, listener) -> None:
+    """Registers event listener unless it is registered already."""
+    if not event.contains(target, identifier, listener):
+        event.listen(target, identifier, listener)
+
+def instrument_engine(engine) -> None:
+    """Adds statements executed through engine to profiles of requests."""
+    listen_once(engine, "before_cursor_execute", before_cursor_execute)
+    listen_once(engine, "after_cursor_execute", after_cursor_execute)
+
+def render_started(sender, template, context, **extra):
+    """Marks start of template rendering."""
+    profile = current_profile()
+    if profile:
+        g.profile_render_start = perf_counter()
+
+def render_finished(sender, template, context, **extra):
+    """Adds template render time to the request profile."""
+    profile = current_profile()
+    if profile and "profile_render_start" in g:
+        profile.render += perf_counter() - g.pop("profile_render_start")
+
+def start_profile():
+    """Starts profiling request, under cProfile for a sample of requests."""
+    g.profile = RequestProfile()
+    if PROFILE_SAMPLE_RATE and random() < PROFILE_SAMPLE_RATE:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+def finish_profile(response):
+    """Records request profile and reports it in a Server-Timing header."""
+    profile = g.pop("profile", None)
+    if profile is None:
+        return response
+    profiler = g.pop("profiler", None)
+    if profiler:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{request.endpoint}-{dt.now():%Y%m%d%H%M%S%f}.prof")
+        profiler.dump_stats(path)
+        STATS.captures.append(path)
+    profile.total = perf_counter() - profile.started
+    STATS.add(request.url_rule.rule if request.url_rule else "<unmatched>", profile)
+    response.headers.add("Server-Timing",
+                         f"sql;dur={profile.sql * 1000:.2f};"
+                         f'desc="{profile.statements} statements", '
+                         f"orm;dur={profile.orm * 1000:.2f}, "
+                         f"render;dur={profile.render * 1000:.2f}, "
+                         f"slowest-sql;dur={profile.slowest_sql * 1000:.2f}, "
+                         f"total;dur={profile.total * 1000:.2f}")
+    return response
+
+def profile_summary():
+    """Returns aggregated request profiles by route. Only served to admins."""
+    if not (current_user.is_authenticated and current_user.admin):
+        abort(404)
+    return jsonify(STATS.summary())
+
+def init_profiling(app, engines) -> None:
+    """Profiles requests served by app, which runs statements through engines,
+    and adds /admin/profile endpoint."""
+    for engine in engines:
+        instrument_engine(engine)
+    listen_once(RoutingSession, "after_begin", transaction_began)
+    listen_once(RoutingSession, "after_transaction_end", transaction_ended)
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    before_render_template.connect(render_started, app)
+    template_rendered.connect(render_finished, app)
+    app.add_url_rule("/admin/profile", "profile_summary", profile_summary)
@@ -0,0 +1,45 @@
+"""This module routes database statements between a writer and read-only replicas."""
+
+#pylint: disable=import-error
+from itertools import cycle
+from threading import Lock
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+class Router:
+    """Pair of a writer engine and read-only engines that replicate it.
+    With SQLite both sides point to the same file; for Postgres pass
+    the primary and replica engines."""
+
+    def __init__(self, writer: Engine, readers: list[Engine] = None):
+        self.writer = writer
+        self.readers = readers or [writer]
+        self._readers = cycle(self.readers)
+        self._lock = Lock()
+
+    def reader(self) -> Engine:
+        """Returns next read-only engine in round-robin order."""
+        with self._lock:
+            return next(self._readers)
+
+class RoutingSession(Session):
+    """Session that sends plain reads to router readers and flushes, INSERT,
+    UPDATE and DELETE statements to router writer. Once the session has written,
+    reads stay on the writer until commit or rollback, so they see own changes."""
+
+    def __init__(self, router: Router, **kwargs):
+        super().__init__(**kwargs)
+        self.router = router
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase) or self.info.get("writing"):
+            self.info["writing"] = True
+            return self.router.writer
+        return self.router.reader()
+
+@event.listens_for(RoutingSession, "after_commit")
+@event.listens_for(RoutingSession, "after_rollback")
+def end_writing(session):
+    """Routes reads back to readers after write transaction has ended."""
+    session.info.pop("writing", None)
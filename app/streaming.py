@@ -0,0 +1,68 @@
+"""This module implements rendering of listing pages (feed filters, own posts,
+admin user list). With STREAM_LISTINGS=1 listing views ask model functions for
+row iterators and stream the page: the navbar and first rows are sent while
+later rows are still being fetched, and the page is never held in memory whole.
+Headers, and so timings reported in them, are sent before the body renders."""
+
+#pylint: disable=import-error
+import os
+from functools import cached_property
+from flask import render_template, stream_template
+
+STREAM_LISTINGS = os.getenv("STREAM_LISTINGS", "0") == "1"
+
+class StreamedRows:
+    """Rows of an iterator collected as a template iterates over them.
+    Truthy if there is any row, fetching only the first one to tell.
+    Once iterated it behaves as the list of rows."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._first = next(self._rows, None)
+        self._seen = []
+
+    def __bool__(self) -> bool:
+        return self._first is not None
+
+    def __iter__(self):
+        if self._first is None or self._seen:
+            yield from self._seen
+            return
+        self._seen.append(self._first)
+        yield self._first
+        for row in self._rows:
+            self._seen.append(row)
+            yield row
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __getitem__(self, index):
+        return self._seen[index]
+
+class Deferred:
+    """Template value computed when the template first uses it,
+    e.g. a next page link rendered below the rows it depends on."""
+
+    def __init__(self, func):
+        self._func = func
+
+    @cached_property
+    def value(self):
+        """Result of func."""
+        return self._func()
+
+    def __bool__(self) -> bool:
+        return bool(self.value)
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+def render_listing(template: str, name: str, rows, next_url, **context):
+    """Renders template listing rows under name along with next_url(rows) link.
+    Rows given as an iterator are streamed, see STREAM_LISTINGS."""
+    if isinstance(rows, list):
+        return render_template(template, next_url=next_url(rows), **{name: rows}, **context)
+    rows = StreamedRows(rows)
+    return stream_template(template, next_url=Deferred(lambda: next_url(rows)),
+                           **{name: rows}, **context)
@@ -0,0 +1,170 @@
+"""This module implements bulk import and export of posts as NDJSON or CSV,
+used by the `flask posts` CLI commands and admin endpoints (see app.admin).
+
+Records carry title, excerpt, content, tag, username of the author and
+optionally created_at (ISO 8601). Imported records are validated with
+NewPostForm rules and inserted BATCH_SIZE at a time, one transaction each.
+Both directions stream, so memory use does not grow with the number of rows."""
+
+#pylint: disable=import-error
+import io
+import csv
+import json
+from itertools import islice
+from datetime import datetime as dt
+from contextlib import nullcontext
+import click
+from flask.cli import AppGroup
+from werkzeug.datastructures import MultiDict
+from app.forms import new_post_form
+from app.models import add_posts, get_user_ids, post_values, stream_all_posts, CACHE
+from app.api import dumps
+from app.dbschema import ENGINE, deferred_search_index
+
+FORMATS = ("ndjson", "csv")
+#Fields of exported records, also accepted by import
+FIELDS = ("id", "title", "excerpt", "content", "tag", "created_at", "username")
+#Records validated and inserted per transaction
+BATCH_SIZE = 1000
+#Rejected records reported with their errors, the rest are only counted
+MAX_ERRORS = 100
+
+def format_of(path: str, default: str = "ndjson") -> str:
+    """Returns format of a file named path by its extension."""
+    return "csv" if path and path.lower().endswith(".csv") else default
+
+def read_records(file, fmt: str):
+    """Yields (line number, record) of NDJSON or CSV binary file. Records
+    that cannot be parsed are yielded as the error message instead."""
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_num, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield line_num, f"Malformed JSON: {error}."
+            continue
+        yield line_num, record if isinstance(record, dict) else "Record must be an object."
+
+def author_of(record: dict, username: str = None) -> str | None:
+    """Returns username of the author of record, username if it names none."""
+    author = record.get("username") or username
+    return str(author) if author else None
+
+def validate(record: dict, form, user_ids: dict, username: str = None) -> dict | str:
+    """Returns post_values of a valid record, otherwise its errors. The record
+    is loaded into NewPostForm form, which is reused as binding fields of a new
+    form costs more than validating them. Records without username are added
+    as username."""
+    form.process(MultiDict({field: str(record[field]) for field in
+                            ("title", "excerpt", "content", "tag")
+                            if record.get(field) is not None}))
+    errors = [] if form.validate() else \
+        [error for field_errors in form.errors.values() for error in field_errors]
+    author = author_of(record, username)
+    if author not in user_ids:
+        errors.append(f"Unknown user {author}." if author else "Username is required.")
+    created_at = None
+    if record.get("created_at"):
+        try:
+            created_at = dt.fromisoformat(str(record["created_at"]))
+            #Posts store naive local time
+            if created_at.tzinfo:
+                created_at = created_at.astimezone().replace(tzinfo=None)
+        except ValueError:
+            errors.append("created_at must be an ISO 8601 date.")
+    if errors:
+        return " ".join(errors)
+    return post_values(form.title.data, form.excerpt.data, form.content.data,
+                       form.tag.data, user_ids[author], created_at)
+
+def import_posts(file, fmt: str, username: str = None, batch_size: int = BATCH_SIZE):
+    """Imports posts from NDJSON or CSV binary file, yielding running totals
+    {"imported", "rejected", "errors"} after each batch. Records without
+    username are added as username."""
+    totals = {"imported": 0, "rejected": 0, "errors": []}
+    form = new_post_form()
+    records = read_records(file, fmt)
+    while batch := list(islice(records, batch_size)):
+        usernames = {author_of(record, username) for _, record in batch
+                     if isinstance(record, dict)}
+        user_ids = get_user_ids(usernames - {None})
+        rows = []
+        for line_num, record in batch:
+            values = validate(record, form, user_ids, username) \
+                     if isinstance(record, dict) else record
+            if isinstance(values, dict):
+                rows.append(values)
+                continue
+            totals["rejected"] += 1
+            if len(totals["errors"]) < MAX_ERRORS:
+                totals["errors"].append({"line": line_num, "error": values})
+        totals["imported"] += add_posts(rows)
+        yield totals
+
+def csv_line(values) -> bytes:
+    """Returns CSV line of values, dates in ISO 8601 like in NDJSON."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([value.isoformat() if isinstance(value, dt) else value
+                                 for value in values])
+    return buffer.getvalue().encode()
+
+def export_posts(fmt: str, progress=None):
+    """Yields every post with author's username as NDJSON or CSV lines (bytes).
+    Calls progress(exported) after every BATCH_SIZE posts and after the last one."""
+    if fmt == "csv":
+        yield csv_line(FIELDS)
+    exported = 0
+    for post in stream_all_posts():
+        yield csv_line(post) if fmt == "csv" else dumps(post._asdict()) + b"\n"
+        exported += 1
+        if progress and exported % BATCH_SIZE == 0:
+            progress(exported)
+    if progress and exported % BATCH_SIZE:
+        progress(exported)
+
+posts_cli = AppGroup("posts", help="Import and export posts.")
+
+@posts_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--format", "fmt", type=click.Choice(FORMATS),
+              help="Format of the file, by its extension by default.")
+@click.option("--username", help="Author of records without username.")
+@click.option("--batch-size", type=int, default=BATCH_SIZE, show_default=True,
+              help="Records inserted per transaction.")
+@click.option("--defer-search-index", is_flag=True,
+              help="Rebuild the search index once after the import instead of per row. "
+                   "Posts imported meanwhile are not searchable, use while the app is stopped.")
+def import_command(path: str, fmt: str, username: str, batch_size: int,
+                   defer_search_index: bool):
+    """Import posts from NDJSON or CSV file PATH (- for standard input)."""
+    fmt = fmt or format_of(path)
+    if not CACHE.shared:
+        click.echo("warning: CACHE_BACKEND=memory, running servers do not see this import "
+                   "until their cached feed expires (CACHE_TTL). Restart them, or set "
+                   "CACHE_BACKEND=sqlite for both.", err=True)
+    totals = {}
+    indexing = deferred_search_index(ENGINE) if defer_search_index else nullcontext()
+    with indexing, click.open_file(path, "rb") as file:
+        for totals in import_posts(file, fmt, username, batch_size):
+            click.echo(f"imported {totals['imported']}, rejected {totals['rejected']}",
+                       err=True)
+    for error in totals.get("errors", []):
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+
+@posts_cli.command("export")
+@click.argument("path", default="-", type=click.Path(dir_okay=False, allow_dash=True))
+@click.option("--format", "fmt", type=click.Choice(FORMATS),
+              help="Format of the file, by its extension by default.")
+def export_command(path: str, fmt: str):
+    """Export posts to NDJSON or CSV file PATH (standard output by default)."""
+    fmt = fmt or format_of(path)
+    with click.open_file(path, "wb") as file:
+        file.writelines(export_posts(fmt, lambda exported: click.echo(f"exported {exported}",
+                                                                       err=True)))
@@ -1,7 +1,82 @@
 """This module contains utility functions that support various parts of the application."""
 
 import hashlib
+from os import getenv, cpu_count
+from hmac import compare_digest
+from secrets import token_bytes
+from concurrent.futures import ThreadPoolExecutor
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from binascii import Error as DecodeError
+from datetime import datetime as dt
+from app.metrics import PASSWORD_HASH_DURATION
 
-def password_hash(password):
-    """Hashes password using SHA-256 algorithm."""
+#scrypt cost parameters of newly created password hashes.
+#SCRYPT_N (a power of two) scales both time and memory of a single hash.
+SCRYPT_N = int(getenv("SCRYPT_N", "16384"))
+SCRYPT_R = 8
+SCRYPT_P = 1
+#Bounded pool that runs password hashing, so a burst of logins keeps at most
+#HASH_WORKERS cores busy hashing while other requests are served
+HASH_WORKERS = int(getenv("HASH_WORKERS", str(min(4, cpu_count() or 1))))
+HASH_POOL = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+
+def scrypt_digest(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    """Derives 32 byte key from password with scrypt."""
+    return hashlib.scrypt(bytes(password, "utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p, dklen=32)
+
+def password_hash(password: str, n: int = None) -> str:
+    """Hashes password using salted scrypt.
+    Returns "scrypt$n$r$p$salt$digest" string carrying algorithm and parameters."""
+    n = n or SCRYPT_N
+    salt = token_bytes(16)
+    digest = scrypt_digest(password, salt, n, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${n}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+def legacy_password_hash(password: str) -> str:
+    """Hashes password using unsalted SHA-256 algorithm used by older accounts."""
     return hashlib.sha256(bytes(password, "utf-8")).hexdigest()
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    """Checks password against hash produced by password_hash
+    or legacy_password_hash."""
+    if stored_hash.startswith("scrypt$"):
+        _, n, r, p, salt, digest = stored_hash.split("$")
+        candidate = scrypt_digest(password, bytes.fromhex(salt), int(n), int(r), int(p))
+        return compare_digest(candidate.hex(), digest)
+    return compare_digest(legacy_password_hash(password), stored_hash)
+
+def needs_rehash(stored_hash: str) -> bool:
+    """Returns True if hash uses legacy algorithm or outdated cost parameters."""
+    return not stored_hash.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+def run_in_hash_pool(func, *args):
+    """Runs password hashing function in HASH_POOL and waits for its result."""
+    operation = getattr(func, "__name__", "unknown")
+    with PASSWORD_HASH_DURATION.labels(operation).time():
+        return HASH_POOL.submit(func, *args).result()
+
+def encode_cursor(created_at: dt, post_id: int) -> str:
+    """Encodes position of a post in the feed into an opaque URL-safe token."""
+    raw = f"{created_at.isoformat()}|{post_id}"
+    return urlsafe_b64encode(bytes(raw, "utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str) -> tuple[dt, int] | None:
+    """Decodes token produced by encode_cursor.
+    Returns (created_at, post_id) tuple, or None if token is malformed."""
+    try:
+        #Restore padding stripped by encode_cursor
+        raw = urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("utf-8")
+        created_at, post_id = raw.split("|")
+        return dt.fromisoformat(created_at), int(post_id)
+    except (DecodeError, UnicodeDecodeError, ValueError):
+        return None
+
+def fts_phrase(term: str) -> str | None:
+    """Converts user input into FTS5 prefix phrase query matching
+    consecutive tokens of term, the last one as a prefix.
+    Returns None if term contains no searchable tokens."""
+    if not any(char.isalnum() for char in term):
+        return None
+    #Double quotes are escaped by doubling them inside FTS5 strings
+    return '"' + term.replace('"', '""') + '"*'
@@ -0,0 +1,154 @@
+"""This module implements a write-behind queue group-committing inserts.
+
+Every direct add_post commits its own transaction, and request threads
+posting at once queue on SQLite's single writer lock. With WRITE_QUEUE=1
+new posts are handed to a single writer thread instead, which inserts
+whatever is pending (at most WRITE_QUEUE_MAX_BATCH rows, optionally gathered
+for WRITE_QUEUE_MAX_DELAY seconds) in one transaction and resolves a future with
+the id of each row. Callers wait for that future, so a post is acknowledged
+only once committed, with the durability WRITE_QUEUE_SYNCHRONOUS sets."""
+
+#pylint: disable=import-error
+import os
+from time import monotonic
+from queue import SimpleQueue, Empty
+from threading import Thread, Lock
+from concurrent.futures import Future
+from sqlalchemy import insert, Engine
+from sqlalchemy.exc import DBAPIError
+from app.metrics import WRITE_QUEUE_BATCH_SIZE
+
+WRITE_QUEUE = os.getenv("WRITE_QUEUE", "0") == "1"
+#Most rows committed in one transaction
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "64"))
+#Seconds the writer waits for more rows after the first one. By default it
+#commits the rows that queued up while the previous transaction was committing,
+#which batches just as well under load without delaying a lone post.
+WRITE_QUEUE_MAX_DELAY = float(os.getenv("WRITE_QUEUE_MAX_DELAY", "0"))
+#SQLite synchronous level of group commits, SQLITE_SYNCHRONOUS by default.
+#FULL syncs the log on every commit, so acknowledged rows survive power loss,
+#and a group shares the cost of one sync.
+WRITE_QUEUE_SYNCHRONOUS = os.getenv("WRITE_QUEUE_SYNCHRONOUS")
+
+def set_synchronous(conn, level: str) -> str:
+    """Sets synchronous level of conn, returns the previous one. Runs on the
+    driver connection, as the level cannot change inside a transaction and
+    statements executed through conn would begin one."""
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        previous = cursor.execute("PRAGMA synchronous").fetchone()[0]
+        cursor.execute(f"PRAGMA synchronous = {level}")
+    finally:
+        cursor.close()
+    return previous
+
+class WriteQueue:
+    """Single writer thread inserting rows into table through engine,
+    started on the first submitted row. on_commit is called after each
+    group commit, before any of its futures is resolved."""
+
+    def __init__(self, engine: Engine, table, max_batch: int = WRITE_QUEUE_MAX_BATCH,
+                 max_delay: float = WRITE_QUEUE_MAX_DELAY,
+                 synchronous: str = WRITE_QUEUE_SYNCHRONOUS, on_commit=None):
+        self.engine = engine
+        self.table = table
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.synchronous = synchronous
+        self.on_commit = on_commit
+        self._pending = SimpleQueue()
+        self._thread = None
+        self._lock = Lock()
+
+    def submit(self, values: dict) -> Future:
+        """Queues row of column values, returns future of its primary key."""
+        future = Future()
+        with self._lock:
+            #Threads do not survive fork, a worker process starts its own
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+            self._pending.put((values, future))
+        return future
+
+    def close(self) -> None:
+        """Commits rows still pending and stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None and thread.is_alive():
+                self._pending.put(None)
+        if thread is not None:
+            thread.join()
+
+    def _next_batch(self) -> tuple[list, bool]:
+        """Waits for the first pending row and returns it with those that follow
+        within max_delay, up to max_batch, and whether close was requested."""
+        item = self._pending.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        deadline = monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._pending.get(timeout=max(0, deadline - monotonic()))
+            except Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        closing = False
+        while not closing:
+            batch, closing = self._next_batch()
+            if not batch:
+                continue
+            try:
+                outcomes = self._commit([values for values, _ in batch])
+            except Exception as error: #pylint: disable=broad-exception-caught
+                #Keep the writer alive, the waiting callers get the error
+                outcomes = [error] * len(batch)
+            for (_, future), outcome in zip(batch, outcomes):
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+    def _commit(self, rows: list) -> list:
+        """Inserts rows in one transaction and returns their primary keys.
+        If it fails, rows are retried one transaction each, so only rejected
+        rows get the error in place of their primary key."""
+        WRITE_QUEUE_BATCH_SIZE.observe(len(rows))
+        try:
+            outcomes = self._insert(rows)
+        except DBAPIError:
+            if len(rows) == 1:
+                raise
+            outcomes = [self._insert_or_error(row) for row in rows]
+        if self.on_commit:
+            self.on_commit()
+        return outcomes
+
+    def _insert_or_error(self, row: dict):
+        """Returns primary key of inserted row, or the error rejecting it."""
+        try:
+            return self._insert([row])[0]
+        except DBAPIError as error:
+            return error
+
+    def _insert(self, rows: list) -> list:
+        """Inserts rows in one transaction, returns their primary keys."""
+        stmt = insert(self.table).returning(*self.table.__table__.primary_key,
+                                            sort_by_parameter_order=True)
+        with self.engine.connect() as conn:
+            if self.synchronous:
+                restore = set_synchronous(conn, self.synchronous)
+            try:
+                ids = conn.execute(stmt, rows).scalars().all()
+                conn.commit()
+            finally:
+                if self.synchronous:
+                    conn.rollback()
+                    set_synchronous(conn, restore)
+        return ids
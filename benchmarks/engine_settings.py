@@ -0,0 +1,88 @@
+"""Compares homepage and add-post throughput between the original engine
+settings (statement echo, rollback journal, default pragmas) and the tuned
+production defaults of app.dbschema.
+
+Run with:  python -m benchmarks.engine_settings [--posts 10000] [--requests 300]
+Each profile runs in its own process against its own freshly seeded database,
+because the engine is configured from environment when app.dbschema is imported."""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from time import perf_counter
+from tempfile import TemporaryDirectory
+
+PROFILES = {
+    "baseline": {"DB_ECHO": "1", "SQLITE_JOURNAL_MODE": "DELETE",
+                 "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_CACHE_SIZE": "-2000",
+                 "SQLITE_MMAP_SIZE": "0", "SQLITE_TEMP_STORE": "DEFAULT",
+                 "SQLITE_BUSY_TIMEOUT": "0"},
+    "tuned": {},
+}
+
+def seed(posts: int) -> None:
+    """Inserts a user and posts into the database configured by DB_PATH."""
+    #pylint: disable=import-outside-toplevel
+    from datetime import datetime as dt, timedelta
+    from sqlalchemy import insert
+    from app.dbschema import ENGINE, User, Post
+    start = dt(2024, 1, 1)
+    with ENGINE.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "email": "bench@blog.com",
+                                     "username": "bench", "password_hash": ""}])
+        conn.execute(insert(Post), [{"title": f"Post {i}", "excerpt": "Excerpt " * 10,
+                                     "content": "Content " * 100, "tag": "Bench",
+                                     "timestamp": "", "created_at": start + timedelta(minutes=i),
+                                     "user_id": 1} for i in range(posts)])
+
+def run(posts: int, requests: int) -> dict:
+    """Seeds database and measures requests/sec of GET / and POST /add-post."""
+    #pylint: disable=import-outside-toplevel
+    from app import make_app
+    seed(posts)
+    app = make_app()
+    client = app.test_client()
+    client.post("/register", data={"email": "reader@blog.com", "username": "reader",
+                                   "password": "password", "confirm_password": "password"})
+    results = {}
+    for name, request in (
+            ("homepage", lambda i: client.get("/")),
+            ("add_post", lambda i: client.post("/add-post", data={
+                "title": f"Title {i}", "excerpt": "Benchmark excerpt",
+                "content": "Benchmark content", "tag": "Bench"}))):
+        start = perf_counter()
+        for i in range(requests):
+            assert request(i).status_code in (200, 302)
+        results[name] = round(requests / (perf_counter() - start), 1)
+    return results
+
+def main():
+    """Runs every profile in a subprocess and prints requests/sec as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=10000, help="posts seeded in the database")
+    parser.add_argument("--requests", type=int, default=300, help="requests measured per path")
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        result = run(args.posts, args.requests)
+        #Statement echo writes to stdout as well, result goes last
+        print("\n" + json.dumps(result), flush=True)
+        return
+
+    report = {}
+    with TemporaryDirectory() as tmp:
+        for profile, settings in PROFILES.items():
+            #Measure database, not the feed cache
+            env = {**os.environ, **settings, "CACHE_TTL": "0",
+                   "DB_PATH": os.path.join(tmp, f"{profile}.db")}
+            output = subprocess.run([sys.executable, "-m", "benchmarks.engine_settings", "--run",
+                                     "--posts", str(args.posts), "--requests", str(args.requests)],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            report[profile] = json.loads(output.strip().splitlines()[-1])
+    print(json.dumps({"requests_per_sec": report}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Measures login throughput for a range of scrypt cost settings.
+
+Each login verifies one password in HASH_POOL, the same way validate_user does.
+Run with:  python -m benchmarks.password_hashing [--logins 64] [--costs 12 13 14 15]
+Pick the largest SCRYPT_N whose single login latency fits the latency budget."""
+
+import argparse
+import json
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from app.util import password_hash, verify_password, legacy_password_hash, HASH_POOL, HASH_WORKERS
+
+def measure(stored_hash: str, logins: int, concurrency: int) -> dict:
+    """Verifies password logins times from concurrency request threads
+    through HASH_POOL. Returns latency of a single login and logins/sec."""
+    start = perf_counter()
+    verify_password("password", stored_hash)
+    latency = perf_counter() - start
+
+    #Simulate request threads that wait on the hashing pool
+    with ThreadPoolExecutor(max_workers=concurrency) as requests:
+        start = perf_counter()
+        results = list(requests.map(
+            lambda _: HASH_POOL.submit(verify_password, "password", stored_hash).result(),
+            range(logins)))
+        elapsed = perf_counter() - start
+    assert all(results)
+
+    return {"latency_ms": round(latency * 1000, 2),
+            "logins_per_sec": round(logins / elapsed, 1)}
+
+def main():
+    """Runs benchmark and prints one JSON line per cost setting."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64,
+                        help="logins measured per cost setting")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="simulated concurrent request threads")
+    parser.add_argument("--costs", type=int, nargs="+", default=[12, 13, 14, 15, 16],
+                        help="scrypt cost settings as log2(SCRYPT_N)")
+    args = parser.parse_args()
+
+    print(json.dumps({"algorithm": "sha256 (legacy)", "hash_workers": HASH_WORKERS,
+                      **measure(legacy_password_hash("password"),
+                                args.logins, args.concurrency)}))
+    for cost in args.costs:
+        stored_hash = password_hash("password", n=2 ** cost)
+        print(json.dumps({"algorithm": "scrypt", "SCRYPT_N": 2 ** cost,
+                          "hash_workers": HASH_WORKERS,
+                          **measure(stored_hash, args.logins, args.concurrency)}))
+
+if __name__ == "__main__":
+    main()
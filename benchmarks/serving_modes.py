@@ -0,0 +1,120 @@
+"""Compares concurrent-request throughput of the WSGI app (app.app) and the
+ASGI app with async views (app.asgi) on the same seeded database.
+
+Run with:  python -m benchmarks.serving_modes [--posts 10000] [--requests 600]
+                                              [--concurrency 1 8 32]
+Requests are driven in-process, without a server in front: WSGI requests by
+a pool of --concurrency threads, as a threaded WSGI server would, ASGI requests
+by --concurrency tasks on one event loop with ASGI_THREADS set to --concurrency.
+Each mode runs in its own process with the feed cache disabled."""
+
+import os
+import sys
+import json
+import shutil
+import asyncio
+import argparse
+import subprocess
+from time import perf_counter
+from threading import local
+from tempfile import TemporaryDirectory
+from concurrent.futures import ThreadPoolExecutor
+
+#Read paths measured in both modes, cycled through by consecutive requests
+PATHS = [("/", ""), ("/apply-filter", "tag=Bench&title=Post"), ("/read_post", "id=1")]
+
+def wsgi(requests: int, concurrency: int) -> float:
+    """Returns requests/sec of the WSGI app served by concurrency threads."""
+    #pylint: disable=import-outside-toplevel
+    from app import make_app
+    app = make_app(login_disabled=True)
+    clients = local()
+
+    def get(i):
+        if not hasattr(clients, "client"):
+            clients.client = app.test_client()
+        path, query = PATHS[i % len(PATHS)]
+        assert clients.client.get(path, query_string=query).status_code == 200
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        start = perf_counter()
+        list(executor.map(get, range(requests)))
+        return requests / (perf_counter() - start)
+
+def asgi(requests: int, concurrency: int) -> float:
+    """Returns requests/sec of the ASGI app with concurrency requests in flight."""
+    #pylint: disable=import-outside-toplevel
+    from app.asgi import make_asgi_app
+    from app.async_models import dispose_engines
+    app = make_asgi_app(login_disabled=True)
+
+    async def get(i, slots):
+        path, query = PATHS[i % len(PATHS)]
+        scope = {"type": "http", "http_version": "1.1", "scheme": "http", "method": "GET",
+                 "path": path, "root_path": "", "query_string": query.encode(),
+                 "headers": [], "server": ("localhost", 80), "client": ("127.0.0.1", 50000)}
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            messages.append(message)
+
+        async with slots:
+            await app(scope, receive, send)
+        assert messages[0]["status"] == 200
+
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+        start = perf_counter()
+        await asyncio.gather(*(get(i, slots) for i in range(requests)))
+        elapsed = perf_counter() - start
+        await dispose_engines()
+        return requests / elapsed
+
+    return asyncio.run(main())
+
+def main():
+    """Seeds one database, runs every mode and concurrency in a subprocess
+    on a copy of it and prints requests/sec as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=10000, help="posts seeded in the database")
+    parser.add_argument("--requests", type=int, default=600, help="requests measured per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="requests in flight")
+    parser.add_argument("--run", choices=["wsgi", "asgi", "seed"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run == "seed":
+        #pylint: disable=import-outside-toplevel
+        from benchmarks.engine_settings import seed
+        seed(args.posts)
+        return
+    if args.run:
+        mode = {"wsgi": wsgi, "asgi": asgi}[args.run]
+        print(json.dumps(round(mode(args.requests, args.concurrency[0]), 1)), flush=True)
+        return
+
+    report = {"wsgi": {}, "asgi": {}}
+    with TemporaryDirectory() as tmp:
+        dataset = os.path.join(tmp, "dataset.db")
+        command = [sys.executable, "-m", "benchmarks.serving_modes", "--posts", str(args.posts),
+                   "--requests", str(args.requests)]
+        subprocess.run(command + ["--run", "seed"], check=True,
+                       env={**os.environ, "DB_PATH": dataset})
+        for mode, results in report.items():
+            for concurrency in args.concurrency:
+                db_path = os.path.join(tmp, f"{mode}-{concurrency}.db")
+                shutil.copy(dataset, db_path)
+                env = {**os.environ, "DB_PATH": db_path, "CACHE_TTL": "0",
+                       "ASGI_THREADS": str(concurrency)}
+                output = subprocess.run(command + ["--run", mode, "--concurrency",
+                                                   str(concurrency)],
+                                        env=env, capture_output=True, text=True,
+                                        check=True).stdout
+                results[concurrency] = json.loads(output.strip().splitlines()[-1])
+    print(json.dumps({"requests_per_sec": report}, indent=2))
+
+if __name__ == "__main__":
+    main()
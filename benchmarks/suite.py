@@ -0,0 +1,256 @@
+"""Measures latency percentiles and throughput of every model function and view.
+
+Run with:  python -m benchmarks.suite [--scales 1000 100000] [--iterations 200]
+                                      [--save results.json] [--baseline results.json]
+Each scale (number of posts) runs in its own process against a database seeded
+by tests.bulk_data with a fixed seed, with the feed cache disabled so every call
+reaches the database. Model functions run one call per application context,
+like in a request; views run through the Flask test client as a logged-in user.
+With --baseline, cases whose median latency grew by more than --threshold are
+reported and the exit status is 1, so regressions show up in review."""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from time import perf_counter
+from statistics import mean, quantiles
+from tempfile import TemporaryDirectory
+
+#Posts generated for each user of the seeded database
+POSTS_PER_USER = 100
+#Cases that hash a password run this many times fewer iterations
+HASHING_DIVISOR = 10
+HASHING_CASES = {"validate_user", "add_user", "POST /login + GET /logout",
+                 "POST /register + GET /logout"}
+
+def summarize(samples: list[float]) -> dict:
+    """Returns latency percentiles in milliseconds and calls/sec of samples."""
+    cuts = quantiles(samples, n=100, method="inclusive")
+    return {"calls": len(samples),
+            "p50_ms": round(cuts[49] * 1000, 3), "p90_ms": round(cuts[89] * 1000, 3),
+            "p99_ms": round(cuts[98] * 1000, 3), "mean_ms": round(mean(samples) * 1000, 3),
+            "per_sec": round(len(samples) / sum(samples), 1)}
+
+def measure(call, iterations: int, warmup: int = 3) -> dict:
+    """Times iterations calls of call(i) after warmup untimed calls."""
+    for i in range(warmup):
+        call(-1 - i)
+    samples = []
+    for i in range(iterations):
+        start = perf_counter()
+        call(i)
+        samples.append(perf_counter() - start)
+    return summarize(samples)
+
+def model_cases(app, dataset: dict) -> dict:
+    """Returns model function cases, each taking iteration number."""
+    #pylint: disable=import-outside-toplevel
+    from app import models
+
+    def in_context(func):
+        def call(i):
+            with app.app_context():
+                func(i)
+        return call
+
+    cases = {
+        "check_email_exists": lambda i: models.check_email_exists(dataset["email"]),
+        "check_username_exists": lambda i: models.check_username_exists(dataset["username"]),
+        "load_user": lambda i: models.load_user(str(dataset["user_id"])),
+        "get_posts": lambda i: models.get_posts(),
+        "get_posts_page_2": lambda i: models.get_posts(after=dataset["second_page"]),
+        "get_post": lambda i: models.get_post(str(i % dataset["posts"] + 1)),
+        "get_users": lambda i: models.get_users(),
+        "get_user_page": lambda i: models.get_user_page(),
+        "get_user_page_search": lambda i: models.get_user_page(dataset["username"][:3]),
+        "get_user_posts": lambda i: models.get_user_posts(dataset["user_id"]),
+        "filter_posts_tag": lambda i: models.filter_posts(tag=dataset["tag"]),
+        "filter_posts_title": lambda i: models.filter_posts(title=dataset["title"]),
+        "filter_posts_username": lambda i: models.filter_posts(username=dataset["username"]),
+        "validate_user": lambda i: models.validate_user("admin@blog.com", "password"),
+        "add_user": lambda i: models.add_user(f"model{i}@bench.com", f"model{i}", "password"),
+        "add_post": lambda i: dataset["own_posts"].append(
+            models.add_post("Benchmark title", "Benchmark excerpt", "Benchmark content",
+                            "Bench", dataset["user_id"])),
+        "delete_post": lambda i: models.delete_post(dataset["own_posts"].pop(),
+                                                    dataset["user_id"]),
+    }
+    return {name: in_context(call) for name, call in cases.items()}
+
+def view_cases(app, dataset: dict) -> dict:
+    """Returns view cases, each taking iteration number and asserting status."""
+    #pylint: disable=import-outside-toplevel
+    from sqlalchemy import select
+    from app.dbschema import ENGINE, User, Post
+    from app.util import encode_cursor
+    client = app.test_client()
+    client.post("/register", data={"email": "reader@bench.com", "username": "reader",
+                                   "password": "password", "confirm_password": "password"})
+    #Separate client logs in and out without ending the session of client
+    guest = app.test_client()
+    admin = app.test_client()
+    admin.post("/login", data={"email": "admin@blog.com", "password": "password"})
+    post = {"title": "Benchmark title", "excerpt": "Benchmark excerpt",
+            "content": "Benchmark content", "tag": "Bench"}
+    after = encode_cursor(*dataset["second_page"])
+    own_posts = []
+
+    def get(path, query=None, user=client):
+        def call(i):
+            response = user.get(path, query_string=query(i) if query else None)
+            assert response.status_code == 200, (path, response.status_code)
+        return call
+
+    def get_path(path):
+        def call(i):
+            response = client.get(path(i))
+            assert response.status_code == 200, (path(i), response.status_code)
+        return call
+
+    def add_post(i):
+        assert client.post("/add-post", data=post).status_code == 302
+
+    def delete_post(i):
+        if not own_posts:
+            #Posts added by add_post, looked up on the first (untimed) warmup call
+            with ENGINE.connect() as conn:
+                own_posts.extend(conn.execute(select(Post.id).join(User).
+                                              where(User.email == "reader@bench.com")).
+                                 scalars())
+        response = client.get("/delete_post", query_string={"id": own_posts.pop()},
+                              headers={"Referer": "/my-posts"})
+        assert response.status_code == 302
+
+    def login(i):
+        response = guest.post("/login", data={"email": "reader@bench.com",
+                                              "password": "password"})
+        assert response.status_code == 302
+        guest.get("/logout")
+
+    def register(i):
+        response = guest.post("/register", data={"email": f"view{i}@bench.com",
+                                                 "username": f"view{i}",
+                                                 "password": "password",
+                                                 "confirm_password": "password"})
+        assert response.status_code == 302
+        guest.get("/logout")
+
+    return {
+        "GET /": get("/"),
+        "GET /?after": get("/", query=lambda i: {"after": after}),
+        "GET /about": get("/about"),
+        "GET /add-post": get("/add-post"),
+        "GET /read_post": get("/read_post", query=lambda i: {"id": i % dataset["posts"] + 1}),
+        "GET /apply-filter tag": get("/apply-filter", query=lambda i: {"tag": dataset["tag"]}),
+        "GET /apply-filter title": get("/apply-filter",
+                                       query=lambda i: {"title": dataset["title"]}),
+        "GET /my-posts": get("/my-posts"),
+        "GET /cache-stats": get("/cache-stats", user=admin),
+        "GET /admin/users": get("/admin/users", user=admin),
+        "GET /api/v1/posts": get("/api/v1/posts"),
+        "GET /api/v1/posts/<id>": get_path(lambda i: f"/api/v1/posts/{i % dataset['posts'] + 1}"),
+        "GET /login": get("/login", user=guest),
+        "GET /register": get("/register", user=guest),
+        "POST /add-post": add_post,
+        "GET /delete_post": delete_post,
+        "POST /login + GET /logout": login,
+        "POST /register + GET /logout": register,
+    }
+
+def describe_dataset() -> dict:
+    """Returns values of the seeded database that cases look up."""
+    #pylint: disable=import-outside-toplevel
+    from sqlalchemy import select, func
+    from app.dbschema import ENGINE, User, Post
+    with ENGINE.connect() as conn:
+        user = conn.execute(select(User).where(User.admin.is_(False)).limit(1)).first()
+        posts = conn.execute(select(func.count()).select_from(Post)).scalar()
+        tag, title = conn.execute(select(Post.tag, Post.title).limit(1)).first()
+        second_page = conn.execute(select(Post.created_at, Post.id).
+                                   order_by(Post.created_at.desc(), Post.id.desc()).
+                                   offset(99).limit(1)).first()
+    return {"user_id": user.id, "email": user.email, "username": user.username,
+            "posts": posts, "tag": tag, "title": title.split()[0],
+            "second_page": tuple(second_page), "own_posts": []}
+
+def run(posts: int, iterations: int) -> dict:
+    """Seeds database with posts and measures every case."""
+    #pylint: disable=import-outside-toplevel
+    from app import make_app
+    from tests.bulk_data import generate
+    generate(max(posts // POSTS_PER_USER, 1), min(posts, POSTS_PER_USER), seed=1)
+    dataset = describe_dataset()
+    app = make_app()
+
+    results = {"models": {}, "views": {}}
+    for group, cases in (("models", model_cases(app, dataset)),
+                         ("views", view_cases(app, dataset))):
+        for name, call in cases.items():
+            count = max(iterations // HASHING_DIVISOR, 5) if name in HASHING_CASES \
+                    else iterations
+            results[group][name] = measure(call, count)
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Returns descriptions of cases whose median latency grew more than
+    threshold (a fraction) compared to baseline."""
+    regressions = []
+    for scale, groups in results["scales"].items():
+        for group, cases in groups.items():
+            for name, stats in cases.items():
+                before = baseline.get("scales", {}).get(scale, {}).get(group, {}).get(name)
+                if not before or not before["p50_ms"]:
+                    continue
+                change = stats["p50_ms"] / before["p50_ms"] - 1
+                if change > threshold:
+                    regressions.append(f"{scale} posts, {group} {name}: p50 "
+                                       f"{before['p50_ms']}ms -> {stats['p50_ms']}ms "
+                                       f"(+{change:.0%})")
+    return regressions
+
+def main():
+    """Runs every scale in a subprocess and prints results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 100000],
+                        help="posts seeded in the database of each scale")
+    parser.add_argument("--iterations", type=int, default=200, help="calls measured per case")
+    parser.add_argument("--save", help="write results to this file")
+    parser.add_argument("--baseline", help="compare median latencies with results in this file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="median latency growth reported as regression (default 0.25)")
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run(args.scales[0], args.iterations)), flush=True)
+        return
+
+    results = {"iterations": args.iterations, "scales": {}}
+    with TemporaryDirectory() as tmp:
+        for posts in args.scales:
+            #Measure database, not the feed cache
+            env = {**os.environ, "CACHE_TTL": "0", "USER_CACHE_TTL": "0",
+                   "DB_PATH": os.path.join(tmp, f"{posts}.db")}
+            output = subprocess.run([sys.executable, "-m", "benchmarks.suite", "--run",
+                                     "--scales", str(posts),
+                                     "--iterations", str(args.iterations)],
+                                    env=env, capture_output=True, text=True,
+                                    check=True).stdout
+            results["scales"][str(posts)] = json.loads(output.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compares add_post throughput and latency of direct commits and the
+group-committing write queue (WRITE_QUEUE=1) under concurrent posting.
+
+Run with:  python -m benchmarks.write_queue [--posts 2000] [--concurrency 1 8 32]
+Each profile and concurrency runs in its own process against a fresh database,
+because the queue and pragmas are configured from environment on import.
+--concurrency threads call add_post in their own application context, as
+request threads of a threaded WSGI server would. Profiles ending in -full
+sync every commit (SQLITE_SYNCHRONOUS=FULL), so posts survive power loss."""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from time import perf_counter
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+from concurrent.futures import ThreadPoolExecutor
+
+PROFILES = {
+    "direct": {},
+    "queue": {"WRITE_QUEUE": "1"},
+    "direct-full": {"SQLITE_SYNCHRONOUS": "FULL"},
+    "queue-full": {"WRITE_QUEUE": "1", "SQLITE_SYNCHRONOUS": "FULL"},
+}
+
+def run(posts: int, concurrency: int) -> dict:
+    """Adds posts from concurrency threads, returns posts/sec, latency
+    percentiles in milliseconds and number of failed writes."""
+    #pylint: disable=import-outside-toplevel
+    from app import make_app
+    from app.models import add_post
+    from benchmarks.engine_settings import seed
+    seed(0)
+    app = make_app()
+    failures = []
+
+    def post(i):
+        start = perf_counter()
+        try:
+            with app.app_context():
+                add_post(f"Title {i}", "Benchmark excerpt", "Benchmark content", "Bench", 1)
+        except Exception as error: #pylint: disable=broad-exception-caught
+            failures.append(error)
+        return perf_counter() - start
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        start = perf_counter()
+        latencies = list(executor.map(post, range(posts)))
+        elapsed = perf_counter() - start
+    p50, p99 = (quantiles(latencies, n=100)[i] * 1000 for i in (49, 98))
+    return {"posts_per_sec": round(posts / elapsed, 1), "p50_ms": round(p50, 2),
+            "p99_ms": round(p99, 2), "failures": len(failures)}
+
+def main():
+    """Runs every profile and concurrency in a subprocess and prints results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=2000, help="posts added per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="threads adding posts at once")
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run(args.posts, args.concurrency[0])), flush=True)
+        return
+
+    report = {}
+    with TemporaryDirectory() as tmp:
+        for profile, settings in PROFILES.items():
+            report[profile] = {}
+            for concurrency in args.concurrency:
+                env = {**os.environ, **settings,
+                       "DB_PATH": os.path.join(tmp, f"{profile}-{concurrency}.db")}
+                output = subprocess.run([sys.executable, "-m", "benchmarks.write_queue", "--run",
+                                         "--posts", str(args.posts),
+                                         "--concurrency", str(concurrency)],
+                                        env=env, capture_output=True, text=True,
+                                        check=True).stdout
+                report[profile][concurrency] = json.loads(output.strip().splitlines()[-1])
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,19 @@
-"""When executed, this script will generate mock users and mock posts in the database."""
+"""When executed, this script will generate mock users and mock posts in the database.
+Run with:  python -m tests [--users 5] [--posts-per-user 5] [--seed N] [--batch-size 10000]"""
 
-from .mock_posts import generate_posts
-from .mock_users import generate_users
+import argparse
+from time import perf_counter
+from .bulk_data import generate, BATCH_SIZE
 
-generate_users()
-generate_posts()
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--users", type=int, default=5, help="users to generate")
+parser.add_argument("--posts-per-user", type=int, default=5, help="posts generated for each user")
+parser.add_argument("--seed", type=int, help="generate the same data on every run")
+parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                    help="rows inserted per transaction")
+args = parser.parse_args()
+
+start = perf_counter()
+generate(args.users, args.posts_per_user, seed=args.seed, batch_size=args.batch_size,
+         progress=lambda table, count: print(f"{table}: {count} rows, "
+                                             f"{perf_counter() - start:.1f}s", flush=True))
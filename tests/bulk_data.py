@@ -0,0 +1,104 @@
+"""Generates large mock datasets (e.g. benchmark databases of millions of posts).
+Rows are generated lazily and inserted in batches with Core executemany,
+so memory use does not grow with the number of rows. Faker is only used to
+fill small pools of texts up front, combining pooled texts is much faster
+than calling Faker for every row. The search index is built once at the end."""
+#pylint: disable=import-error
+from random import Random
+from itertools import islice
+from datetime import datetime as dt, timedelta
+from faker import Faker
+from sqlalchemy import insert, select, func
+from app.dbschema import User, Post, ENGINE, deferred_search_index
+from app.util import password_hash
+
+#Generated posts are created between these dates, newest first in the feed
+POSTS_FROM = dt(2020, 1, 1)
+POSTS_UNTIL = dt(2024, 1, 1)
+#Rows inserted per transaction
+BATCH_SIZE = 10000
+#Distinct texts of each kind rows are composed from
+POOL_SIZE = 1000
+
+class TextPool:
+    """Pools of Faker texts that posts and users are composed from."""
+
+    def __init__(self, fake: Faker, size: int = POOL_SIZE):
+        self.titles = [fake.sentence() for _ in range(size)]
+        self.excerpts = [fake.text(max_nb_chars=200) for _ in range(size)]
+        self.contents = [fake.text(max_nb_chars=1000) for _ in range(size)]
+        #Small vocabulary, so filtering by tag matches many posts as in a real blog
+        self.tags = [fake.word().capitalize() for _ in range(max(size // 10, 1))]
+        self.names = [fake.user_name() for _ in range(size)]
+        self.domains = [fake.free_email_domain() for _ in range(max(size // 100, 1))]
+
+def batched(rows, size: int):
+    """Yields lists of at most size consecutive rows."""
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+def user_rows(quantity: int, first_id: int, pool: TextPool, rng: Random):
+    """Yields quantity user rows with ids from first_id. Ids are appended
+    to usernames and emails, which have to be unique."""
+    #Hashing is slow by design, every generated user gets password "password"
+    pswd_hash = password_hash("password")
+    for user_id in range(first_id, first_id + quantity):
+        username = f"{rng.choice(pool.names)}{user_id}"
+        yield {"id": user_id, "username": username,
+               "email": f"{username}@{rng.choice(pool.domains)}",
+               "password_hash": pswd_hash, "admin": False}
+
+def post_rows(user_ids: range, posts_per_user: int, pool: TextPool, rng: Random):
+    """Yields posts_per_user post rows for each user id."""
+    span = int((POSTS_UNTIL - POSTS_FROM).total_seconds())
+    for user_id in user_ids:
+        for _ in range(posts_per_user):
+            created_at = POSTS_FROM + timedelta(seconds=rng.randrange(span))
+            yield {"title": rng.choice(pool.titles), "excerpt": rng.choice(pool.excerpts),
+                   "content": rng.choice(pool.contents), "tag": rng.choice(pool.tags),
+                   "timestamp": created_at.strftime("%m/%d/%Y, %H:%M"),
+                   "created_at": created_at, "user_id": user_id}
+
+def load(engine, table, rows, batch_size: int = BATCH_SIZE, progress=None) -> int:
+    """Inserts rows into table in transactions of batch_size rows.
+    Calls progress(inserted) after each batch. Returns number of rows."""
+    inserted = 0
+    for batch in batched(rows, batch_size):
+        with engine.begin() as conn:
+            conn.execute(insert(table), batch)
+        inserted += len(batch)
+        if progress:
+            progress(inserted)
+    return inserted
+
+def generate(users: int, posts_per_user: int, seed: int = None, engine=ENGINE,
+             batch_size: int = BATCH_SIZE, progress=None) -> tuple[int, int]:
+    """Adds users, each with posts_per_user posts, and an admin user if there
+    is none. Same seed generates the same rows into the same database.
+    progress(table_name, inserted) is called after each batch.
+    Returns number of inserted users and posts."""
+    fake = Faker()
+    fake.seed_instance(seed)
+    rng = Random(seed)
+    pool = TextPool(fake)
+    with engine.connect() as conn:
+        first_id = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+        has_admin = conn.execute(select(User.id).where(User.admin.is_(True))).first()
+    if not has_admin:
+        with engine.begin() as conn:
+            conn.execute(insert(User), [{"id": first_id, "username": "admin",
+                                         "email": "admin@blog.com", "admin": True,
+                                         "password_hash": password_hash("password")}])
+        first_id += 1
+
+    def report(table):
+        return (lambda count: progress(table, count)) if progress else None
+
+    inserted_users = load(engine, User, user_rows(users, first_id, pool, rng),
+                          batch_size, report("user"))
+    user_ids = range(first_id, first_id + users)
+    with deferred_search_index(engine):
+        inserted_posts = load(engine, Post, post_rows(user_ids, posts_per_user, pool, rng),
+                              batch_size, report("post"))
+    return inserted_users, inserted_posts
@@ -2,6 +2,7 @@
 
 #pylint: disable=import-error disable=unused-argument
 #pylint: disable=redefined-outer-name disable=too-few-public-methods
+from collections import namedtuple
 import pytest
 from flask import Flask
 from sqlalchemy.orm import Session
@@ -13,19 +14,21 @@ from app.forms import RegisterForm
 from app.dbschema import User, Post, ENGINE
 from app import make_app
 from app.util import password_hash
+from app.models import CACHE, FRAGMENTS
 
-@pytest.fixture(scope="session")
-def g():
-    """Returns a simulateed g object."""
-    class G:
-        """Simulates g object."""
-
-    return G()
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Starts every test with empty cache, tests write posts
+    directly through the session which does not invalidate it."""
+    CACHE.clear()
+    FRAGMENTS.clear()
 
 @pytest.fixture(scope="module")
 def session():
     """Yields a session object."""
-    session = Session(ENGINE)
+    #Loaded attributes stay valid after commit, reading them again would
+    #begin a transaction holding the write lock
+    session = Session(ENGINE, expire_on_commit=False)
 
     yield session
 
@@ -42,7 +45,7 @@ def test_user(session):
         id=1,
         email="andrew@gmail.com",
         username="andrew",
-        password_hash="password",
+        password_hash=password_hash("password"),
         admin=True)
     session.add(user)
     session.flush()
@@ -102,6 +105,14 @@ def post_object(current_user):
         )
     return obj
 
+@pytest.fixture
+def post_summary(post_object):
+    """Returns row shaped like post summaries returned by feed queries."""
+    summary = namedtuple("PostSummary", ["id", "title", "excerpt", "tag",
+                                         "timestamp", "created_at", "username"])
+    return summary(post_object.id, post_object.title, post_object.excerpt,
+                   post_object.tag, post_object.timestamp, None, "andrew")
+
 #When mock_posts fixturee is requested, it will triggeer the chain of fixture requests
 #that will clean up the database, generate mock users, and generate mock posts.
 @pytest.fixture(scope="module")
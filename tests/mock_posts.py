@@ -16,7 +16,8 @@ def generate_posts(ppu=5) -> None:
         users = session.execute(select(User)).all()
         for user in users:
             for _ in range(ppu):
-                timestamp = dt.now().strftime("%m/%d/%Y, %H:%M")
+                created_at = dt.now()
+                timestamp = created_at.strftime("%m/%d/%Y, %H:%M")
                 title = fake.sentence()
                 excerpt = fake.text(max_nb_chars=200)
                 content = fake.text(max_nb_chars=1000)
@@ -27,6 +28,7 @@ def generate_posts(ppu=5) -> None:
                             content=content,
                             tag=tag,
                             timestamp=timestamp,
+                            created_at=created_at,
                             user_id=user_id)
                 if user[0].username not in username_post_mapping:
                     username_post_mapping[user[0].username] = []
@@ -0,0 +1,105 @@
+"""This module defines tests for the JSON API located in app.api module."""
+#pylint: disable=import-error disable=unused-argument
+import gzip
+import json
+from datetime import datetime as dt
+from flask import Flask
+from app import make_app
+from app.api import dumps
+from app.models import PAGE_SIZE
+from app.util import decode_cursor
+
+def test_posts(app: Flask, post_summary, mocker):
+    """Test feed listing with field selection."""
+    get_posts = mocker.patch("app.api.get_posts", return_value=[post_summary])
+
+    client = app.test_client()
+    response = client.get("/api/v1/posts", query_string={"fields": "id,title"})
+
+    assert response.status_code == 200
+    assert response.get_json() == {"posts": [{"id": post_summary.id,
+                                              "title": post_summary.title}],
+                                   "next": None}
+    get_posts.assert_called_once_with(after=None)
+
+    response = client.get("/api/v1/posts", query_string={"fields": "id,password_hash"})
+    assert response.status_code == 400
+    assert "password_hash" in response.get_json()["error"]
+
+def test_posts_pagination(app: Flask, post_summary, mocker):
+    """Test that full pages carry cursor of the next page."""
+    created_at = dt(2024, 1, 1, 10, 30)
+    page = [post_summary._replace(created_at=created_at)] * PAGE_SIZE
+    get_posts = mocker.patch("app.api.get_posts", return_value=page)
+
+    client = app.test_client()
+    cursor = client.get("/api/v1/posts").get_json()["next"]
+    assert decode_cursor(cursor) == (created_at, post_summary.id)
+
+    client.get("/api/v1/posts", query_string={"after": cursor})
+    assert get_posts.call_args.kwargs["after"] == (created_at, post_summary.id)
+    assert client.get("/api/v1/posts", query_string={"after": "!"}).status_code == 400
+
+def test_posts_filter(app: Flask, post_summary, mocker):
+    """Test that filter criteria are passed to filter_posts."""
+    filter_posts = mocker.patch("app.api.filter_posts", return_value=[post_summary])
+
+    client = app.test_client()
+    response = client.get("/api/v1/posts", query_string={"tag": "python"})
+
+    assert response.get_json()["posts"][0]["title"] == post_summary.title
+    assert filter_posts.call_args.args[0] == "python"
+    assert client.get("/api/v1/posts", query_string={"title": "t" * 51}).status_code == 400
+
+def test_post(app: Flask, post_object, mocker):
+    """Test single post."""
+    mocker.patch("app.api.get_post", return_value=(post_object, "andrew"))
+
+    client = app.test_client()
+    response = client.get("/api/v1/posts/1", query_string={"fields": "content,username"})
+
+    assert response.get_json() == {"content": post_object.content, "username": "andrew"}
+
+    mocker.patch("app.api.get_post", return_value=None)
+    response = client.get("/api/v1/posts/1")
+    assert response.status_code == 404
+    assert response.get_json() == {"error": "No such post."}
+
+def test_user_posts(app: Flask, post_summary, mocker):
+    """Test listing of user's posts."""
+    get_user_posts = mocker.patch("app.api.get_user_posts", return_value=[post_summary])
+
+    client = app.test_client()
+    response = client.get("/api/v1/users/1/posts")
+
+    assert response.get_json()["posts"][0]["username"] == post_summary.username
+    get_user_posts.assert_called_once_with(1, after=None)
+
+def test_compression(app: Flask, post_summary, mocker):
+    """Test that large responses are gzipped for clients accepting it."""
+    mocker.patch("app.api.get_posts", return_value=[post_summary] * 20)
+
+    client = app.test_client()
+    response = client.get("/api/v1/posts", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert len(json.loads(gzip.decompress(response.data))["posts"]) == 20
+    assert "Content-Encoding" not in client.get("/api/v1/posts").headers
+
+def test_dumps(mocker):
+    """Test that both serializers write the same compact JSON."""
+    payload = {"created_at": dt(2024, 1, 1, 10, 30, 15), "title": "Title", "id": 1}
+    fast = dumps(payload)
+    mocker.patch("app.api.orjson", None)
+    assert dumps(payload) == fast == b'{"created_at":"2024-01-01T10:30:15","title":"Title","id":1}'
+
+def test_unauthorized():
+    """Test that anonymous clients get 401 instead of the login page."""
+    client = make_app().test_client()
+    response = client.get("/api/v1/posts")
+    assert response.status_code == 401
+    assert "error" in response.get_json()
+
+def test_clean_up(session):
+    """Request fixture to trigger database clean-up before the next module."""
@@ -0,0 +1,44 @@
+"""This module defines tests for async model functions located in app.async_models module."""
+#pylint: disable=import-error disable=unused-argument
+import asyncio
+from app.async_models import add_post, get_post, get_posts, filter_posts
+from app.async_models import get_user_posts, delete_post
+from app.async_models import dispose_engines
+
+def run(coroutine):
+    """Runs coroutine in a new event loop. Pooled connections belong
+    to the loop that opened them, so they are closed before it ends."""
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await dispose_engines()
+    return asyncio.run(main())
+
+def test_add_and_get_post(test_user, post, session):
+    """Confirms that post added by add_post is returned by get_post
+    and listed by the feed queries."""
+    post_id = run(add_post(post["title"], post["excerpt"], post["content"],
+                           post["tag"], test_user.id))
+    #Assert if post and its author are fetched
+    fetched = run(get_post(post_id))
+    assert fetched[0].title == post["title"]
+    assert fetched[1] == test_user.username
+
+    assert post_id in [row.id for row in run(get_posts())]
+    assert post_id in [row.id for row in run(get_user_posts(test_user.id))]
+    assert post_id in [row.id for row in run(filter_posts(username=test_user.username))]
+
+def test_delete_post(test_user, post, session):
+    """Confirms that delete_post only deletes post owned by the user."""
+    post_id = run(add_post(post["title"], post["excerpt"], post["content"],
+                           post["tag"], test_user.id))
+    #Post of another user is kept
+    run(delete_post(post_id, test_user.id + 1))
+    assert run(get_post(post_id)) is not None
+
+    run(delete_post(post_id, test_user.id))
+    assert run(get_post(post_id)) is None
+
+def test_clean_up(session):
+    """Request fixture to trigger database clean-up before the next module."""
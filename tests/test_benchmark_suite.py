@@ -0,0 +1,40 @@
+"""This module defines smoke tests for the benchmark suite located in benchmarks.suite module."""
+#pylint: disable=import-error
+import sys
+import json
+import subprocess
+from pathlib import Path
+from benchmarks.suite import compare
+
+def test_suite(tmp_path):
+    """Confirms that the suite runs every case to completion on a tiny database
+    and saves results, so a case broken by a change fails here, not in review."""
+    results_path = tmp_path / "results.json"
+    #Second feed page starts after 100 posts
+    suite = subprocess.run([sys.executable, "-m", "benchmarks.suite", "--scales", "100",
+                            "--iterations", "3", "--save", str(results_path)],
+                           cwd=Path(__file__).parents[1], capture_output=True, text=True,
+                           check=False)
+    #Failing case is reported in the traceback of the child process
+    assert suite.returncode == 0, suite.stderr
+
+    with open(results_path, encoding="utf-8") as file:
+        results = json.load(file)
+    groups = results["scales"]["100"]
+    assert "validate_user" in groups["models"]
+    assert "GET /cache-stats" in groups["views"]
+    for cases in groups.values():
+        for stats in cases.values():
+            assert stats["calls"] >= 3
+
+def test_compare():
+    """Confirms that only median latency growth above threshold is reported."""
+    def results(get_posts_ms, get_post_ms):
+        return {"scales": {"100": {"models": {"get_posts": {"p50_ms": get_posts_ms},
+                                              "get_post": {"p50_ms": get_post_ms}}}}}
+
+    regressions = compare(results(2.0, 1.1), results(1.0, 1.0), 0.25)
+    assert len(regressions) == 1
+    assert "get_posts" in regressions[0]
+    #Cases missing from baseline are not compared
+    assert not compare(results(2.0, 2.0), {"scales": {}}, 0.25)
@@ -0,0 +1,44 @@
+"""This module defines tests for the bulk data generator located in tests.bulk_data module."""
+#pylint: disable=import-error
+from sqlalchemy import select, func, text
+from app.dbschema import Base, User, Post, create_db_engine, create_search_index
+from tests.bulk_data import generate
+
+def bulk_engine(tmp_path, name: str):
+    """Returns engine bound to a new database with the current schema."""
+    engine = create_db_engine(str(tmp_path / name), echo=False)
+    Base.metadata.create_all(engine)
+    create_search_index(engine)
+    return engine
+
+def test_generate(tmp_path):
+    """Confirms that generate inserts requested rows in batches
+    and indexes generated posts for search."""
+    engine = bulk_engine(tmp_path, "bulk.db")
+    assert generate(10, 7, seed=1, engine=engine, batch_size=4) == (10, 70)
+    #Second run adds users after the existing ones and no second admin
+    assert generate(2, 1, engine=engine) == (2, 2)
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(User)).scalar() == 13
+        assert conn.execute(select(func.count()).select_from(User).
+                            where(User.admin.is_(True))).scalar() == 1
+        assert conn.execute(select(func.count()).select_from(Post)).scalar() == 72
+        tag = conn.execute(select(Post.tag)).scalar()
+        matches = conn.execute(text("SELECT count(*) FROM post_fts WHERE post_fts MATCH :query"),
+                               {"query": f'tag : "{tag}"'}).scalar()
+        assert matches == conn.execute(select(func.count()).select_from(Post).
+                                       where(Post.tag == tag)).scalar()
+
+def test_generate_seed(tmp_path):
+    """Confirms that the same seed generates the same rows."""
+    rows = []
+    for name in ("first.db", "second.db"):
+        engine = bulk_engine(tmp_path, name)
+        generate(3, 5, seed=42, engine=engine)
+        with engine.connect() as conn:
+            rows.append(conn.execute(select(Post.title, Post.tag, Post.created_at,
+                                            User.username).
+                                     join_from(Post, User, Post.user_id == User.id).
+                                     order_by(Post.id)).all())
+    assert rows[0] == rows[1]
@@ -0,0 +1,79 @@
+"""Tests for caches located in app.cache module."""
+#pylint: disable=import-error
+from app.cache import TTLCache, SQLiteCache
+
+def test_ttl_cache_get_set():
+    """Confirms that TTLCache returns stored values and counts hits and misses."""
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_ttl_cache_evicts_least_recently_used():
+    """Confirms that TTLCache evicts least recently used entry when full."""
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    #Touch "a" so "b" becomes least recently used
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_cache_expires(mocker):
+    """Confirms that TTLCache treats entries older than ttl as missing."""
+    clock = mocker.patch("app.cache.monotonic", return_value=100)
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set("a", 1)
+
+    clock.return_value = 131
+    assert cache.get("a") is None
+
+def test_ttl_cache_disabled():
+    """Confirms that TTLCache with ttl of 0 never stores values."""
+    cache = TTLCache(maxsize=2, ttl=0)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+
+def test_sqlite_cache_shared(tmp_path):
+    """Confirms that SQLiteCache entries and generations written
+    by one worker are seen by another one."""
+    path = str(tmp_path / "cache.db")
+    worker_a = SQLiteCache(path, maxsize=10, ttl=30)
+    worker_b = SQLiteCache(path, maxsize=10, ttl=30)
+
+    worker_a.set("post:1", ("title", 1))
+    assert worker_b.get("post:1") == ("title", 1)
+
+    worker_b.delete("post:1")
+    assert worker_a.get("post:1") is None
+
+    assert worker_b.generation("feed") == 0
+    worker_a.bump("feed")
+    assert worker_b.generation("feed") == 1
+
+def test_cache_epoch(tmp_path):
+    """Confirms that generations of SQLiteCache workers share an epoch,
+    while TTLCache generations restarting in a new process get a new one."""
+    path = str(tmp_path / "cache.db")
+    assert SQLiteCache(path).epoch == SQLiteCache(path).epoch
+    assert SQLiteCache(str(tmp_path / "new.db")).epoch != SQLiteCache(path).epoch
+    assert TTLCache().epoch != TTLCache().epoch
+
+def test_sqlite_cache_evicts_oldest(tmp_path):
+    """Confirms that SQLiteCache evicts oldest written entries when full."""
+    cache = SQLiteCache(str(tmp_path / "cache.db"), maxsize=2, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+
+    assert cache.get("a") is None
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
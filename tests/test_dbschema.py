@@ -0,0 +1,104 @@
+"""This module defines tests for schema migrations located in app.dbschema module."""
+#pylint: disable=import-error
+from datetime import datetime as dt
+from sqlalchemy import create_engine, inspect, text
+from app.dbschema import migrate, create_search_index, create_db_engine
+from app.dbschema import deferred_search_index
+
+def legacy_engine(tmp_path):
+    """Returns engine bound to a database created with the original schema."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE user (id INTEGER PRIMARY KEY, email VARCHAR, "
+                          "username VARCHAR, password_hash VARCHAR, admin BOOLEAN)"))
+        conn.execute(text("CREATE TABLE post (id INTEGER PRIMARY KEY, title VARCHAR(50), "
+                          "excerpt VARCHAR(200), content VARCHAR, tag VARCHAR(50), "
+                          "timestamp VARCHAR, user_id INTEGER)"))
+        conn.execute(text("INSERT INTO post (title, timestamp, user_id) VALUES "
+                          "('older', '12/31/2023, 09:00', 1), ('newer', '01/02/2024, 13:05', 1)"))
+    return engine
+
+def test_migrate(tmp_path):
+    """Confirms that migrate adds and backfills created_at column
+    and creates the feed index on an existing database."""
+    engine = legacy_engine(tmp_path)
+    #Running migration twice must be harmless
+    migrate(engine)
+    migrate(engine)
+
+    index_names = [index["name"] for index in inspect(engine).get_indexes("post")]
+    assert "ix_post_created_at" in index_names
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT title, created_at FROM post "
+                                 "ORDER BY created_at DESC")).all()
+    #Assert if posts are ordered chronologically across years
+    assert [row[0] for row in rows] == ["newer", "older"]
+    assert dt.fromisoformat(rows[0][1]) == dt(2024, 1, 2, 13, 5)
+
+def test_create_db_engine(tmp_path):
+    """Confirms that create_db_engine applies pragmas to new connections."""
+    engine = create_db_engine(str(tmp_path / "test.db"), echo=False,
+                              pragmas={"journal_mode": "WAL", "synchronous": "NORMAL",
+                                       "temp_store": "MEMORY"})
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        #NORMAL is reported as 1, MEMORY as 2
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2
+    assert not engine.echo
+
+def test_create_search_index(tmp_path):
+    """Confirms that create_search_index indexes existing posts
+    and keeps the index in sync with inserts and deletes."""
+    engine = legacy_engine(tmp_path)
+    migrate(engine)
+    assert create_search_index(engine)
+    #Creating index second time must be harmless
+    assert create_search_index(engine)
+
+    query = text("SELECT rowid FROM post_fts WHERE post_fts MATCH :query")
+    with engine.begin() as conn:
+        #Existing post is indexed
+        assert conn.execute(query, {"query": 'title : "old"*'}).all() == [(1,)]
+        conn.execute(text("INSERT INTO post (id, title, user_id) VALUES (3, 'fresh', 1)"))
+        assert conn.execute(query, {"query": 'title : "fresh"'}).all() == [(3,)]
+        conn.execute(text("DELETE FROM post WHERE id = 3"))
+        assert conn.execute(query, {"query": 'title : "fresh"'}).all() == []
+
+def test_create_search_index_repair(tmp_path):
+    """Confirms that create_search_index restores triggers a killed
+    deferred_search_index left dropped and indexes posts written meanwhile."""
+    engine = legacy_engine(tmp_path)
+    migrate(engine)
+    create_search_index(engine)
+
+    query = text("SELECT rowid FROM post_fts WHERE post_fts MATCH :query")
+    indexing = deferred_search_index(engine)
+    indexing.__enter__()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO post (id, title, user_id) VALUES (3, 'bulk', 1)"))
+    #Process is killed before the context exits, the next start repairs the index
+    assert create_search_index(engine)
+    with engine.begin() as conn:
+        assert conn.execute(query, {"query": 'title : "bulk"'}).all() == [(3,)]
+        conn.execute(text("INSERT INTO post (id, title, user_id) VALUES (4, 'fresh', 1)"))
+        assert conn.execute(query, {"query": 'title : "fresh"'}).all() == [(4,)]
+
+def test_deferred_search_index(tmp_path):
+    """Confirms that posts inserted while the index is deferred
+    are searchable afterwards and triggers are restored."""
+    engine = legacy_engine(tmp_path)
+    migrate(engine)
+    create_search_index(engine)
+
+    query = text("SELECT rowid FROM post_fts WHERE post_fts MATCH :query")
+    with deferred_search_index(engine):
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO post (id, title, user_id) VALUES (3, 'bulk', 1)"))
+            #Index is not updated row by row
+            assert conn.execute(query, {"query": 'title : "bulk"'}).all() == []
+    with engine.begin() as conn:
+        assert conn.execute(query, {"query": 'title : "bulk"'}).all() == [(3,)]
+        conn.execute(text("INSERT INTO post (id, title, user_id) VALUES (4, 'fresh', 1)"))
+        assert conn.execute(query, {"query": 'title : "fresh"'}).all() == [(4,)]
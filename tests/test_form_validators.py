@@ -18,8 +18,8 @@ def test_check_credentials(mocker, form, session):
     """Confirms that check_credentials function properly"""
     #Mock get_session function
     mocker.patch("app.models.get_session", return_value=session)
-    #Mock password_hash function
-    mocker.patch("app.models.password_hash", return_value=form.password.data + "1")
+    #Submit wrong password
+    mocker.patch.object(form.password, "data", form.password.data + "1")
     #Check if test user exists
     with pytest.raises(ValidationError):
         check_credentials(form, form.email)
@@ -33,3 +33,11 @@ def test_verify_username_in_use(mocker, form, session):
     #Check if test user exists
     with pytest.raises(ValidationError):
         verify_username_in_use(form, form.username)
+
+def test_check_credentials_sets_user(mocker, form, session):
+    """Confirms that check_credentials stores authenticated user on the form"""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    check_credentials(form, form.email)
+
+    assert form.user.email == form.email.data
@@ -0,0 +1,36 @@
+"""This module defines tests for fragment caching located in app.fragments module."""
+#pylint: disable=import-error
+from jinja2 import Environment
+from app.cache import TTLCache
+from app.fragments import FragmentCacheExtension, fragment_key
+
+def make_env(cache) -> Environment:
+    """Returns autoescaping environment caching fragments in cache."""
+    env = Environment(autoescape=True, extensions=[FragmentCacheExtension])
+    env.fragment_cache = cache
+    return env
+
+def test_fragment_cache():
+    """Confirms that fragments are rendered once per key and stay escaped."""
+    cache = TTLCache(maxsize=10, ttl=30)
+    template = make_env(cache).from_string(
+        '{% for post in posts %}{% cache "card", post.id %}'
+        '<p>{{ post.title }}</p>{% endcache %}{% endfor %}')
+
+    posts = [{"id": 1, "title": "<b>first</b>"}, {"id": 2, "title": "second"}]
+    assert template.render(posts=posts) == \
+        "<p>&lt;b&gt;first&lt;/b&gt;</p><p>second</p>"
+    assert cache.get(fragment_key("card", 2)) == "<p>second</p>"
+
+    #Cached markup is reused, not escaped again
+    posts[0]["title"] = "changed"
+    assert template.render(posts=posts[:1]) == "<p>&lt;b&gt;first&lt;/b&gt;</p>"
+
+    cache.delete(fragment_key("card", 1))
+    assert template.render(posts=posts[:1]) == "<p>changed</p>"
+
+def test_fragment_cache_disabled():
+    """Confirms that fragments are rendered every time without a cache."""
+    template = make_env(None).from_string('{% cache "card", n %}{{ n }}{% endcache %}')
+    assert template.render(n=1) == "1"
+    assert template.render(n=2) == "2"
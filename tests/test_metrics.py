@@ -0,0 +1,35 @@
+"""This module defines tests for metrics located in app.metrics module."""
+#pylint: disable=import-error disable=unused-argument
+from app.models import UserRecord
+from app.util import verify_password, password_hash, run_in_hash_pool
+
+def test_metrics(app, test_user, mocker):
+    """Confirms that requests, cache lookups, pool checkouts and password
+    hashing are reported to monitoring clients in text exposition format."""
+    mocker.patch("app.decorators.MONITORING_TOKEN", "secret")
+    client = app.test_client()
+    client.get("/")
+    client.get("/")
+    run_in_hash_pool(verify_password, "password", password_hash("password"))
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    body = response.get_data(as_text=True)
+    assert 'blog_requests_total{endpoint="index",method="GET",status="200"}' in body
+    assert 'blog_request_duration_seconds_bucket{endpoint="index",le="+Inf"}' in body
+    assert 'blog_cache_lookups_total{kind="feed",result="hit"}' in body
+    assert 'blog_db_pool_checkout_wait_seconds_count{pool="reader"}' in body
+    assert 'blog_password_hash_seconds_count{operation="verify_password"}' in body
+
+def test_metrics_forbidden(app, test_user, mocker):
+    """Confirms that metrics are only served to admins and monitoring clients,
+    not to clients trusted for their address, e.g. behind a local proxy."""
+    client = app.test_client()
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"}).status_code == 404
+
+    mocker.patch("app.decorators.current_user", UserRecord(1, "andrew@gmail.com", "andrew", True))
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "10.0.0.1"}).status_code == 200
+
+def test_clean_up(session):
+    """Request fixture to trigger database clean-up before the next module."""
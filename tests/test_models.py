@@ -1,48 +1,119 @@
 """This module defines tests for database models located in app.models module."""
 #pylint: disable=import-error disable=unused-argument
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, delete, func
 from app.models import get_session, validate_user, load_user, add_user, get_user_posts
+from app.models import forget_user
 from app.models import check_email_exists, check_username_exists, add_post
 from app.models import get_post, get_posts, get_users, filter_posts, delete_post
+from app.models import CACHE, UserRecord, unit_of_work, post_modified, feed_version
+from app.models import FRAGMENTS, POST_FRAGMENTS, get_user_page
+from app.fragments import fragment_key
+from app.cache import TTLCache, SQLiteCache
 from app.dbschema import User, Post
-
-def test_get_session(g, mocker):
-    """Confirms that get_session function properly
-    handles storage and retrieval of db_session
-    from g context object."""
-    #Set mocked db_session on simulated g object
-    setattr(g, "db_session", 13)
-    #Patch autheentic g object
-    mocker.patch("app.models.g", g)
-    #Get session object
-    session = get_session()
-
-    #Assert if session object is equal to mocked db_session
-    assert session == 13
-
-    #Remove mocked db_session from g object
-    delattr(g, "db_session")
-    #Get session object
-    session = get_session()
-
-    #Assert if session object is a real newly ccreated session object
-    assert isinstance(session, Session)
+from app.util import legacy_password_hash
+
+def test_get_session(app):
+    """Confirms that get_session function returns one session
+    per application context and discards it on teardown."""
+    with app.app_context():
+        #Get session object
+        session = get_session()
+        #Assert if session is reused within the same context
+        assert get_session() is session
+        assert isinstance(session, Session)
+        #Assert if no connection is checked out before the first statement
+        assert not session.in_transaction()
+
+    with app.app_context():
+        #Assert if a new context gets a new session
+        assert get_session() is not session
+
+def test_unit_of_work(mocker, test_user, session):
+    """Confirms that unit_of_work commits the outermost unit and
+    rolls back only the failed nested unit."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    with unit_of_work():
+        add_post("kept", "excerpt", "content", "tag", test_user.id)
+        try:
+            with unit_of_work() as nested:
+                nested.add(Post(title="discarded", user_id=test_user.id))
+                nested.flush()
+                raise ValueError
+        except ValueError:
+            pass
+    #Assert if the transaction was ended, releasing the connection
+    assert not session.in_transaction()
+
+    titles = session.execute(select(Post.title).where(Post.user_id == test_user.id)).scalars()
+    titles = titles.all()
+    assert "kept" in titles
+    assert "discarded" not in titles
+    #Remove post so later tests see the original fixture data
+    session.execute(delete(Post).where(Post.title == "kept"))
+    session.commit()
+
+def test_unit_of_work_rollback(mocker, test_user, session):
+    """Confirms that rolling back the outermost unit also undoes
+    nested units that completed."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    try:
+        with unit_of_work():
+            add_post("rolled back", "excerpt", "content", "tag", test_user.id)
+            raise ValueError
+    except ValueError:
+        pass
+    assert not session.in_transaction()
+
+    count = session.scalar(select(func.count(Post.id)).where(Post.title == "rolled back"))
+    assert count == 0
+    session.commit()
 
 def test_validate_user(mocker, test_user, session):
     """Confirms that validate_user function properly
     validates user credentials."""
     #Mock get_session function
     mocker.patch("app.models.get_session", return_value=session)
-    #Mock return value of password_hash function
-    mocker.patch("app.models.password_hash", return_value="password")
-    #Create mocked User object
+    #Validate test user credentials
     user = validate_user("andrew@gmail.com", "password")
 
     #Assert if user is not None
     assert user is not None
     assert isinstance(user, User)
 
+    #Assert if wrong password or unknown email are rejected
+    assert validate_user("andrew@gmail.com", "wrong password") is None
+    assert validate_user("nobody@gmail.com", "password") is None
+
+def test_validate_user_releases_connection(mocker, test_user, session):
+    """Confirms that validate_user hashes the password outside a transaction,
+    so logins waiting for the hash pool do not hold database connections."""
+    mocker.patch("app.models.get_session", return_value=session)
+    in_transaction = []
+    def run_in_hash_pool(func, *args):
+        in_transaction.append(session.in_transaction())
+        return func(*args)
+    mocker.patch("app.models.run_in_hash_pool", side_effect=run_in_hash_pool)
+
+    assert validate_user("andrew@gmail.com", "password") is not None
+    assert in_transaction == [False]
+
+def test_validate_user_rehash(mocker, new_user, session):
+    """Confirms that validate_user upgrades legacy SHA-256 hash
+    to scrypt on successful login."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    #Store legacy hash for the user
+    new_user.password_hash = legacy_password_hash("password")
+    session.commit()
+
+    assert validate_user(new_user.email, "password") is not None
+    assert new_user.password_hash.startswith("scrypt$")
+    #Assert if user can still log in with upgraded hash
+    assert validate_user(new_user.email, "password") is not None
+
 def test_load_user(test_user, mocker, session):
     """Confirms that load_user function properly
     loads test user from database by id."""
@@ -52,13 +123,28 @@ def test_load_user(test_user, mocker, session):
     user = load_user(test_user.id)
     #Assert if user is not None
     assert user is not None
-    assert isinstance(user, User)
+    assert isinstance(user, UserRecord)
+    assert user.admin == test_user.admin
 
     #Load non-existing user
-    user = load_user(2)
+    user = load_user(999999)
     #Assert if user is None
     assert user is None
 
+def test_load_user_cache(test_user, mocker, session):
+    """Confirms that load_user serves repeated calls from CACHE
+    until forget_user is called."""
+    #Mock get_session function
+    get_session = mocker.patch("app.models.get_session", return_value=session)
+    load_user(str(test_user.id))
+    #Second call does not touch the database
+    assert load_user(str(test_user.id)).email == test_user.email
+    assert get_session.call_count == 1
+
+    forget_user(test_user.id)
+    load_user(str(test_user.id))
+    assert get_session.call_count == 2
+
 def test_add_user(mocker, session):
     """Confirms that add_user function properly
     adds user to database."""
@@ -130,7 +216,8 @@ def test_get_posts(mocker, session):
     mocker.patch("app.models.get_session", return_value=session)
     #Get posts from database
     existing_posts = session.execute(select(Post).
-                                     order_by(Post.timestamp.desc())).all()
+                                     order_by(Post.created_at.desc(),
+                                              Post.id.desc())).all()
 
     #Get posts from database using get_posts
     posts = get_posts()
@@ -139,8 +226,108 @@ def test_get_posts(mocker, session):
     #Assert if posts are retrieved in same order
     for ex_post, post in zip(existing_posts, posts):
         #Assert if post is equal to existing_post
-        assert post[0].id == ex_post[0].id
-        assert post[0].title == ex_post[0].title
+        assert post.id == ex_post[0].id
+        assert post.title == ex_post[0].title
+
+def test_get_posts_summary(mocker, session):
+    """Confirms that get_posts returns lightweight rows without post content."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    #Get posts from database using get_posts
+    posts = get_posts()
+
+    assert posts
+    for post in posts:
+        #Assert if row carries card fields but no ORM entity or content
+        assert not isinstance(post[0], Post)
+        assert post.username is not None
+        assert "content" not in post._fields
+
+def test_get_posts_cache(mocker, test_user, post, session):
+    """Confirms that get_posts serves repeated calls from CACHE
+    and that add_post invalidates it."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    posts = get_posts()
+    hits = CACHE.stats()["hits"]
+    #Second call is served from cache
+    assert get_posts() == posts
+    assert CACHE.stats()["hits"] == hits + 1
+
+    post_id = add_post(post["title"], post["excerpt"], post["content"], post["tag"], test_user.id)
+    #Assert if newly added post is visible right away
+    assert get_posts()[0].id == post_id
+
+def test_get_post_cache(mocker, test_user, post, session):
+    """Confirms that get_post serves repeated calls from CACHE
+    and that delete_post invalidates it."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    post_id = add_post(post["title"], post["excerpt"], post["content"], post["tag"], test_user.id)
+
+    cached_post = get_post(post_id)
+    assert get_post(str(post_id))[0].title == cached_post[0].title
+    assert CACHE.stats()["hits"] >= 1
+
+    delete_post(post_id, test_user.id)
+    assert get_post(post_id) is None
+
+def test_post_modified(mocker, test_user, post, session):
+    """Confirms that post_modified returns creation time of existing posts only."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    post_id = add_post(post["title"], post["excerpt"], post["content"], post["tag"], test_user.id)
+    created_at = session.get(Post, post_id).created_at
+
+    assert post_modified(str(post_id)) == created_at
+    #Served from the cached post as well
+    get_post(post_id)
+    assert post_modified(post_id) == created_at
+    assert post_modified("abc") is None
+
+    version = feed_version()
+    delete_post(post_id, test_user.id)
+    assert post_modified(post_id) is None
+    #Assert if deleting the post changed feed version
+    assert feed_version() != version
+
+def test_feed_version_other_process(mocker, tmp_path):
+    """Confirms that feed writes of another process change feed version
+    at once through a shared cache and within CACHE_TTL otherwise."""
+    #Another process bumps generations of its own in-memory cache
+    other = TTLCache(ttl=30)
+    mocker.patch("app.models.CACHE", TTLCache(ttl=30))
+    clock = mocker.patch("app.models.time", return_value=60)
+    version = feed_version()
+    other.bump("feed")
+    assert feed_version() == version
+    clock.return_value = 90
+    assert feed_version() != version
+
+    path = str(tmp_path / "cache.db")
+    other = SQLiteCache(path)
+    mocker.patch("app.models.CACHE", SQLiteCache(path))
+    version = feed_version()
+    other.bump("feed")
+    assert feed_version() != version
+
+    #Without caching the feed has no version
+    mocker.patch("app.models.CACHE", TTLCache(ttl=0))
+    assert feed_version() is None
+
+def test_delete_post_fragments(mocker, test_user, post, session):
+    """Confirms that delete_post drops rendered fragments of the post."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    post_id = add_post(post["title"], post["excerpt"], post["content"], post["tag"], test_user.id)
+    created_at = session.get(Post, post_id).created_at
+    session.commit()
+    for name in POST_FRAGMENTS:
+        FRAGMENTS.set(fragment_key(name, post_id, created_at), "<div></div>")
+
+    delete_post(str(post_id), test_user.id)
+    for name in POST_FRAGMENTS:
+        assert FRAGMENTS.get(fragment_key(name, post_id, created_at)) is None
 
 def test_get_users(mocker, session):
     """Confirms that get_users function properly
@@ -158,6 +345,34 @@ def test_get_users(mocker, session):
     #Assert if the number of users retrieved by both methods is equal
     assert len(existing_users) == len(users)
 
+def test_get_user_page(mock_posts, mocker, session):
+    """Confirms that get_user_page walks non-admin users page by page
+    along with their post counts and searches them by prefix."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    posts = dict(session.execute(select(Post.user_id, func.count()).
+                                 group_by(Post.user_id)).all())
+    users = session.execute(select(User.id, User.username).where(User.admin.is_(False)).
+                            order_by(User.id)).all()
+
+    paged_users = []
+    after = None
+    while page := get_user_page(limit=2, after=after):
+        paged_users.extend(page)
+        after = page[-1].id
+    #Assert if pages concatenate to all users with their post counts
+    assert [user.id for user in paged_users] == [user.id for user in users]
+    for user in paged_users:
+        assert user.posts == posts.get(user.id, 0)
+        assert "password_hash" not in user._fields
+
+    username = users[0].username
+    assert users[0].id in [user.id for user in get_user_page(username[:3])]
+    assert all(user.username.startswith(username[:3]) or user.email.startswith(username[:3])
+               for user in get_user_page(username[:3]))
+    #Assert if search ignores case like the stored lowercase usernames
+    assert users[0].id in [user.id for user in get_user_page(username[:3].upper())]
+
 def test_filter_posts(mock_posts, mocker, session):
     """Confirms that filter_posts function properly."""
 
@@ -187,6 +402,22 @@ def test_filter_posts(mock_posts, mocker, session):
         #Assert if the number of posts retrieved by both methods is equal
         assert len(filtered_posts) == len(posts)
 
+def test_filter_posts_without_fts(mock_posts, mocker, session):
+    """Confirms that filter_posts falls back to LIKE matching
+    when SQLite has no FTS5 support."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    #Simulate SQLite compiled without FTS5
+    mocker.patch("app.models.FTS_ENABLED", False)
+    #Unpack mock posts
+    _, tag_post_mapping, title_post_mapping = mock_posts
+
+    for tag, posts in tag_post_mapping.items():
+        assert len(filter_posts(tag=tag)) == len(posts)
+
+    for title, posts in title_post_mapping.items():
+        assert len(filter_posts(title=title)) == len(posts)
+
 def test_get_user_posts(mocker, session):
     """Confirms that get_user_posts function properly."""
 
@@ -197,6 +428,26 @@ def test_get_user_posts(mocker, session):
     #Assert if the number of posts retrieved by both methods is equal
     assert len(user_posts) == 5
 
+def test_get_posts_pagination(mocker, session):
+    """Confirms that walking get_posts pages with after cursor
+    yields every post exactly once in feed order."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    #Get all posts in a single page
+    all_posts = get_posts(limit=1000)
+
+    paged_posts = []
+    after = None
+    while True:
+        page = get_posts(limit=7, after=after)
+        paged_posts.extend(page)
+        if len(page) < 7:
+            break
+        after = (page[-1].created_at, page[-1].id)
+
+    #Assert if pages concatenate to the full feed
+    assert [post.id for post in paged_posts] == [post.id for post in all_posts]
+
 def test_delete_post(mocker, session):
     """Confirms that delete_post function properly"""
     #Mock get_session function
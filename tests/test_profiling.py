@@ -0,0 +1,57 @@
+"""This module defines tests for request profiling located in app.profiling module."""
+#pylint: disable=import-error disable=unused-argument
+import pytest
+from app import make_app
+from app.models import ROUTER, UserRecord
+from app.profiling import init_profiling, STATS
+
+@pytest.fixture
+def profiled_app():
+    """Returns application with profiling enabled."""
+    app = make_app(login_disabled=True)
+    init_profiling(app, {ROUTER.writer, *ROUTER.readers})
+    return app
+
+def server_timing(response) -> dict:
+    """Returns durations reported in Server-Timing headers by metric name."""
+    metrics = {}
+    for header in response.headers.getlist("Server-Timing"):
+        for metric in header.split(", "):
+            name, *params = metric.split(";")
+            metrics[name] = float(params[0].removeprefix("dur="))
+    return metrics
+
+def test_server_timing(profiled_app, test_user, mocker):
+    """Confirms that SQL, ORM and render time are reported per request."""
+    response = profiled_app.test_client().get("/apply-filter", query_string={"tag": "python"})
+    assert response.status_code == 200
+
+    metrics = server_timing(response)
+    assert metrics["sql"] > 0
+    assert metrics["render"] > 0
+    assert metrics["total"] >= metrics["sql"] + metrics["render"]
+    assert 'desc="1 statements"' in response.headers["Server-Timing"]
+
+def test_profile_summary(profiled_app, test_user, mocker):
+    """Confirms that aggregated profiles are only served to admins."""
+    client = profiled_app.test_client()
+    client.get("/apply-filter", query_string={"tag": "python"})
+    assert client.get("/admin/profile").status_code == 404
+
+    mocker.patch("app.profiling.current_user", UserRecord(1, "andrew@gmail.com", "andrew", True))
+    summary = client.get("/admin/profile").get_json()["routes"]["/apply-filter"]
+    assert summary["requests"] >= 1
+    assert summary["statements"]["p50"] == 1
+    assert summary["slowest_statement"]["sql"].startswith("SELECT")
+
+def test_sampled_cprofile(profiled_app, test_user, mocker, tmp_path):
+    """Confirms that sampled requests are captured with cProfile."""
+    mocker.patch("app.profiling.PROFILE_SAMPLE_RATE", 1)
+    mocker.patch("app.profiling.PROFILE_DIR", str(tmp_path))
+    profiled_app.test_client().get("/about")
+
+    assert [path.name.startswith("about-") for path in tmp_path.iterdir()] == [True]
+    assert STATS.captures[-1].startswith(str(tmp_path))
+
+def test_clean_up(session):
+    """Request fixture to trigger database clean-up before the next module."""
@@ -0,0 +1,60 @@
+"""This module verifies with EXPLAIN QUERY PLAN that queries issued
+by functions in app.models module are served by indexes."""
+#pylint: disable=import-error disable=unused-argument
+import pytest
+from sqlalchemy import event
+from app.dbschema import ENGINE
+from app.models import validate_user, load_user, check_email_exists, check_username_exists
+from app.models import get_posts, get_post, get_user_posts, filter_posts, delete_post
+from app.models import get_user_page
+
+@pytest.fixture
+def statements():
+    """Collects SQL statements with parameters executed on ENGINE."""
+    collected = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "DELETE", "UPDATE")):
+            collected.append((statement, parameters))
+
+    event.listen(ENGINE, "before_cursor_execute", collect)
+    yield collected
+    event.remove(ENGINE, "before_cursor_execute", collect)
+
+def full_scans(session, statement, parameters) -> list[str]:
+    """Returns query plan steps of statement that read a table without an index.
+    Scans of subqueries (anon_N) only read rows the subquery produced."""
+    plan = session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement,
+                                                parameters).all()
+    return [step[3] for step in plan
+            if step[3].startswith("SCAN") and "USING" not in step[3]
+            and "VIRTUAL TABLE" not in step[3] and not step[3].startswith("SCAN anon_")]
+
+@pytest.mark.parametrize("model_function", [
+    lambda: validate_user("andrew@gmail.com", "password"),
+    lambda: load_user("1"),
+    lambda: check_email_exists("andrew@gmail.com"),
+    lambda: check_username_exists("andrew"),
+    get_posts,
+    lambda: get_post(1),
+    lambda: get_user_posts(1),
+    lambda: filter_posts(tag="python", title="flask"),
+    lambda: delete_post(0, 1),
+    lambda: get_user_page("and", after=1),
+], ids=["validate_user", "load_user", "check_email_exists", "check_username_exists",
+        "get_posts", "get_post", "get_user_posts", "filter_posts", "delete_post",
+        "get_user_page"])
+def test_model_function_uses_index(model_function, statements, test_user, mocker, session):
+    """Confirms that every statement issued by model function is index-backed."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    #Start with empty identity map so lookups by primary key emit SQL
+    session.expunge_all()
+    model_function()
+
+    assert statements
+    for statement, parameters in statements:
+        assert full_scans(session, statement, parameters) == [], statement
+
+def test_clean_up(session):
+    """Request fixture to trigger database clean-up before the next module."""
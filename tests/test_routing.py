@@ -0,0 +1,45 @@
+"""Tests for statement routing located in app.routing module."""
+#pylint: disable=import-error disable=redefined-outer-name
+import pytest
+from sqlalchemy import select, insert, event
+from sqlalchemy.exc import OperationalError
+from app.dbschema import Base, Post, create_db_engine
+from app.routing import Router, RoutingSession
+
+@pytest.fixture
+def router(tmp_path):
+    """Returns router over a temporary database with a read-only replica engine."""
+    path = str(tmp_path / "routing.db")
+    writer = create_db_engine(path, echo=False)
+    Base.metadata.create_all(writer)
+    reader = create_db_engine(path, echo=False, read_only=True)
+    return Router(writer, [reader])
+
+def engine_log(router) -> list[str]:
+    """Records which engine executes each statement."""
+    log = []
+    event.listen(router.writer, "before_cursor_execute",
+                 lambda *args: log.append("writer"))
+    event.listen(router.readers[0], "before_cursor_execute",
+                 lambda *args: log.append("reader"))
+    return log
+
+def test_routing_session(router):
+    """Confirms that reads go to reader, writes go to writer and reads
+    after a write stay on writer until commit."""
+    log = engine_log(router)
+    with RoutingSession(router) as session:
+        session.execute(select(Post))
+        session.add(Post(title="title", user_id=1))
+        session.flush()
+        session.execute(select(Post))
+        session.commit()
+        session.execute(select(Post))
+
+    assert log == ["reader", "writer", "writer", "reader"]
+
+def test_reader_is_read_only(router):
+    """Confirms that read-only engine refuses writes."""
+    with router.readers[0].connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(insert(Post).values(title="title"))
@@ -0,0 +1,50 @@
+"""This module defines tests for streamed listings located in app.streaming module."""
+#pylint: disable=import-error disable=unused-argument
+from datetime import datetime as dt
+from app.streaming import StreamedRows, Deferred
+from app.models import filter_posts, get_user_page
+
+def test_streamed_rows():
+    """Confirms that StreamedRows only fetches the first row to tell if it
+    is empty and behaves as the list of rows once iterated."""
+    fetched = []
+
+    def rows():
+        for row in range(3):
+            fetched.append(row)
+            yield row
+
+    streamed = StreamedRows(rows())
+    assert streamed
+    assert fetched == [0]
+    assert list(streamed) == [0, 1, 2]
+    assert len(streamed) == 3
+    assert streamed[-1] == 2
+    assert list(streamed) == [0, 1, 2]
+
+    assert not StreamedRows(iter([]))
+    assert not list(StreamedRows(iter([])))
+
+def test_deferred():
+    """Confirms that Deferred computes its value once, when first used."""
+    calls = []
+    value = Deferred(lambda: calls.append(1) or "/next")
+    assert not calls
+    assert value and str(value) == "/next"
+    assert calls == [1]
+    assert not Deferred(lambda: None)
+
+def test_stream_rows(mock_posts, mocker, session):
+    """Confirms that listing functions stream the same rows they return."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    after = (dt(2100, 1, 1), 0)
+    posts = filter_posts(after=after)
+    assert posts
+    assert list(filter_posts(after=after, stream=True)) == posts
+    assert list(get_user_page(limit=3, stream=True)) == get_user_page(limit=3)
+    #Assert if the unit of work ended with the stream
+    assert not session.in_transaction()
+
+def test_clean_up(session):
+    """Request fixture to trigger database clean-up before the next module."""
@@ -0,0 +1,129 @@
+"""This module defines tests for bulk import and export located in app.transfer module."""
+#pylint: disable=import-error disable=unused-argument disable=redefined-outer-name
+import io
+import csv
+import json
+import pytest
+from flask import Flask
+from sqlalchemy import select, func
+from app import make_app
+from app.dbschema import Post
+from app.models import filter_posts
+from app.transfer import import_posts, export_posts, read_records, FIELDS
+
+@pytest.fixture(scope="module")
+def app() -> Flask:
+    """Configure instance of the application with authentication enabled."""
+    return make_app(login_disabled=False)
+
+def ndjson(*records) -> io.BytesIO:
+    """Returns binary NDJSON file of records, dictionaries or raw lines."""
+    return io.BytesIO(b"".join((record if isinstance(record, bytes) else
+                                json.dumps(record).encode()) + b"\n" for record in records))
+
+def test_read_records():
+    """Confirms that unparsable lines are reported by line number."""
+    file = ndjson({"title": "First"}, b"", b"{oops", b"[1]")
+    records = list(read_records(file, "ndjson"))
+    assert records[0] == (1, {"title": "First"})
+    assert records[1][0] == 3 and "Malformed JSON" in records[1][1]
+    assert records[2] == (4, "Record must be an object.")
+
+    file = io.BytesIO("title,tag\r\n\"Multi\nline\",python\r\n".encode())
+    assert list(read_records(file, "csv")) == [(3, {"title": "Multi\nline", "tag": "python"})]
+
+def test_import_posts(test_user, post, session, mocker):
+    """Confirms that valid records are inserted in batches and invalid ones
+    are counted and reported with their errors."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    file = ndjson(dict(post, username=test_user.username, created_at="2024-01-01T10:30:00"),
+                  dict(post, title=""),
+                  dict(post, username="nobody"),
+                  dict(post, created_at="yesterday"),
+                  post)
+    progress = []
+    for totals in import_posts(file, "ndjson", test_user.username, batch_size=2):
+        progress.append((totals["imported"], totals["rejected"]))
+
+    assert progress == [(1, 1), (1, 3), (2, 3)]
+    errors = totals["errors"]
+    assert [error["line"] for error in errors] == [2, 3, 4]
+    assert "Unknown user nobody." in errors[1]["error"]
+    assert "ISO 8601" in errors[2]["error"]
+    imported = session.scalars(select(Post).where(Post.title == post["title"])).all()
+    assert len(imported) == 2
+    assert {row.user_id for row in imported} == {test_user.id}
+    assert "01/01/2024, 10:30" in {row.timestamp for row in imported}
+
+def test_export_round_trip(test_user, post, session, mocker):
+    """Confirms that exported posts import back in both formats."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    progress = mocker.Mock()
+    exported = b"".join(export_posts("ndjson", progress))
+    records = [json.loads(line) for line in exported.splitlines()]
+    assert records and set(records[0]) == set(FIELDS)
+    progress.assert_called_once_with(len(records))
+
+    exported = b"".join(export_posts("csv"))
+    rows = list(csv.DictReader(io.StringIO(exported.decode())))
+    assert [row["title"] for row in rows] == [record["title"] for record in records]
+
+    count = session.scalar(select(func.count(Post.id)))
+    totals = list(import_posts(io.BytesIO(exported), "csv"))[-1]
+    assert totals["imported"] == len(rows) and not totals["rejected"]
+    assert session.scalar(select(func.count(Post.id))) == count + len(rows)
+
+def test_cli(app: Flask, test_user, post, session, mocker, tmp_path):
+    """Confirms that flask posts commands import and export files."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    path = tmp_path / "posts.csv"
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["posts", "export", str(path)])
+    assert result.exit_code == 0
+    count = len(list(csv.DictReader(path.open(newline=""))))
+
+    result = runner.invoke(args=["posts", "import", str(path), "--defer-search-index"])
+    assert result.exit_code == 0
+    assert f"imported {count}, rejected 0" in result.output
+    #Feed cached by a server under the memory backend is not invalidated
+    assert "CACHE_BACKEND=memory" in result.output
+    #Search index is rebuilt with imported posts
+    assert filter_posts(title=post["title"])
+
+    path = tmp_path / "posts.ndjson"
+    path.write_bytes(ndjson(dict(post, title="")).getvalue())
+    result = runner.invoke(args=["posts", "import", str(path), "--username",
+                                 test_user.username])
+    assert "imported 0, rejected 1" in result.output
+    assert "line 1:" in result.output
+
+def test_admin_endpoints(app: Flask, test_user, new_user, post, session, mocker):
+    """Confirms that admins export and import posts over HTTP."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    client = app.test_client()
+    assert client.get("/admin/posts/export").status_code == 302
+
+    client.post("/login", data={"email": new_user.email, "password": "password"})
+    assert client.get("/admin/posts/export").status_code == 404
+    client.get("/logout")
+
+    client.post("/login", data={"email": test_user.email, "password": "password"})
+    response = client.get("/admin/posts/export", query_string={"format": "csv"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert response.data.startswith(",".join(FIELDS).encode())
+    assert client.get("/admin/posts/export", query_string={"format": "xml"}).status_code == 400
+
+    response = client.post("/admin/posts/import", query_string={"username": new_user.username},
+                           data=ndjson(post, post).getvalue())
+    assert response.status_code == 200
+    assert json.loads(response.data.splitlines()[-1]) == {"imported": 2, "rejected": 0,
+                                                          "errors": []}
+
+def test_clean_up(session):
+    """Request fixture to trigger database clean-up before the next module."""
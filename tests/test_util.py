@@ -0,0 +1,16 @@
+"""Tests for utility functions located in app.util module."""
+#pylint: disable=import-error
+from datetime import datetime as dt
+from app.util import encode_cursor, decode_cursor
+
+def test_cursor_round_trip():
+    """Confirms that decode_cursor restores values encoded by encode_cursor."""
+    created_at = dt(2024, 1, 2, 13, 5, 7, 123)
+    token = encode_cursor(created_at, 42)
+
+    assert decode_cursor(token) == (created_at, 42)
+
+def test_decode_cursor_malformed():
+    """Confirms that decode_cursor returns None for malformed tokens."""
+    assert decode_cursor("not a cursor") is None
+    assert decode_cursor("") is None
@@ -0,0 +1,82 @@
+"""This module contains tests of the ASGI serving mode with authentication disabled."""
+#pylint: disable=import-error disable=unused-argument
+import asyncio
+from urllib.parse import urlencode
+from markupsafe import escape
+import pytest
+from app.asgi import make_asgi_app
+from app.async_views import ASYNC_VIEWS
+from app.async_models import dispose_engines
+
+@pytest.fixture(scope="module")
+def asgi_app():
+    """Returns ASGI application with async views."""
+    return make_asgi_app(login_disabled=True)
+
+def request(app, method: str, path: str, query: str = "", body: bytes = b"") -> tuple:
+    """Sends HTTP request to ASGI app. Returns status, headers and body."""
+    scope = {"type": "http", "http_version": "1.1", "scheme": "http", "method": method,
+             "path": path, "root_path": "", "query_string": query.encode(),
+             "headers": [(b"content-type", b"application/x-www-form-urlencoded"),
+                         (b"content-length", str(len(body)).encode())],
+             "server": ("localhost", 80), "client": ("127.0.0.1", 50000)}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body}
+
+    async def send(message):
+        messages.append(message)
+
+    async def main():
+        try:
+            await app(scope, receive, send)
+        finally:
+            await dispose_engines()
+
+    asyncio.run(main())
+    return (messages[0]["status"], dict(messages[0]["headers"]),
+            b"".join(message.get("body", b"") for message in messages[1:]))
+
+def test_async_views_installed(asgi_app):
+    """Confirms that database-bound views are replaced by async versions."""
+    for endpoint, view in ASYNC_VIEWS.items():
+        assert asgi_app.wsgi_application.view_functions[endpoint] is view
+
+def test_index(asgi_app, test_user):
+    """Test homepage served by async view."""
+    status, headers, body = request(asgi_app, "GET", "/")
+    assert status == 200
+    assert b"Offcanvas with post filtering options" in body
+    assert b"db-conn" in headers[b"server-timing"]
+
+def test_add_post_v(asgi_app, post, test_user, current_user, mocker):
+    """Test /add-post route and that the new post is found by filter."""
+    mocker.patch("app.async_views.current_user", current_user)
+    status, headers, _ = request(asgi_app, "POST", "/add-post", body=urlencode(post).encode())
+    assert status == 302
+    assert headers[b"location"] == b"/"
+
+    status, _, body = request(asgi_app, "GET", "/apply-filter",
+                              query=urlencode({"username": test_user.username}))
+    assert status == 200
+    assert escape(post["title"]).encode() in body
+
+def test_lifespan(asgi_app, mocker):
+    """Confirms that async engines are disposed on server shutdown."""
+    dispose = mocker.patch("app.async_models.dispose_engines")
+    events = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+    sent = []
+
+    async def receive():
+        return next(events)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(asgi_app({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    dispose.assert_called_once()
+
+def test_clean_up(session):
+    """Request fixture to trigger database clean-up before the next module."""
@@ -1,9 +1,11 @@
 """This module contains tests that are executed with authentication disabled
 as if the user is authenticated."""
 #pylint: disable=import-error disable=unused-argument
+from datetime import datetime as dt
 from flask import Flask
 from sqlalchemy.orm import Session
 from app.dbschema import ENGINE
+from app.models import CACHE, UserRecord
 
 def get_test_session():
     """Yields a session object for testing."""
@@ -17,6 +19,63 @@ def test_index(app: Flask):
     assert response.status_code == 200
     assert b"Offcanvas with post filtering options" in response.data
 
+def test_index_cache(app: Flask, post_summary, mocker):
+    """Test that homepage cards are rendered once and served from cache."""
+    get_posts = mocker.patch("app.app.get_posts", return_value=[post_summary])
+
+    client = app.test_client()
+    for _ in range(2):
+        response = client.get("/")
+        assert response.status_code == 200
+        assert bytes(post_summary.title, "utf-8") in response.data
+
+    get_posts.assert_called_once()
+
+def test_index_not_modified(app: Flask, post_summary, mocker):
+    """Test that unchanged homepage is revalidated without querying posts
+    and that post writes change its validator."""
+    get_posts = mocker.patch("app.app.get_posts", return_value=[post_summary])
+
+    client = app.test_client()
+    response = client.get("/")
+    etag = response.headers["ETag"]
+    assert "no-cache" in response.headers["Cache-Control"]
+
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not response.data
+    get_posts.assert_called_once()
+
+    CACHE.bump("feed")
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_index_without_validators(app: Flask, mocker):
+    """Test that homepage carries no ETag when the feed has no version."""
+    mocker.patch("app.app.feed_version", return_value=None)
+    response = app.test_client().get("/", headers={"If-None-Match": "*"})
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+def test_cache_stats(app: Flask, mocker):
+    """Test that cache counters are only served to admins and clients
+    with the monitoring token, local or not."""
+    client = app.test_client()
+    assert client.get("/cache-stats").status_code == 404
+
+    mocker.patch("app.decorators.MONITORING_TOKEN", "secret")
+    response = client.get("/cache-stats", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 404
+    response = client.get("/cache-stats", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "hits" in response.get_json()
+
+    admin = UserRecord(1, "andrew@gmail.com", "andrew", True)
+    mocker.patch("app.decorators.current_user", admin)
+    assert client.get("/cache-stats").status_code == 200
+
 def test_about(app: Flask):
     """Test about page."""
     client = app.test_client()
@@ -61,6 +120,43 @@ def test_read_post(app: Flask, post_object, mocker, session):
 
     assert response.status_code == 302
 
+def test_read_post_not_modified(app: Flask, post_object, mocker):
+    """Test that unchanged post is revalidated by ETag or Last-Modified
+    without fetching it."""
+    modified = dt(2024, 1, 1, 12, 30, 15, 500)
+    mocker.patch("app.app.post_modified", return_value=modified)
+    get_post = mocker.patch("app.app.get_post", return_value=[post_object])
+
+    client = app.test_client()
+    response = client.get("/read_post?id=1", headers={"Referer": "/"})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    response = client.get("/read_post?id=1", headers={"Referer": "/",
+                                                      "If-None-Match": etag})
+    assert response.status_code == 304
+    response = client.get("/read_post?id=1", headers={"Referer": "/",
+                                                      "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    get_post.assert_called_once()
+
+    #Back link differs, so does the page
+    response = client.get("/read_post?id=1", headers={"Referer": "/my-posts",
+                                                      "If-None-Match": etag})
+    assert response.status_code == 200
+
+def test_read_post_reused_id(app: Flask, post_object, mocker):
+    """Test that a post reusing the id of a deleted one is not rendered
+    from the fragment cached for the deleted post."""
+    mocker.patch("app.app.post_modified", return_value=None)
+    client = app.test_client()
+    for title, created_at in (("Deleted post", dt(2024, 1, 1)), ("New post", dt(2024, 1, 2))):
+        post_object.title, post_object.created_at = title, created_at
+        mocker.patch("app.app.get_post", return_value=[post_object, "andrew"])
+        response = client.get("/read_post?id=1")
+        assert bytes(title, "utf-8") in response.data
+
 def test_delete_post(app: Flask, mocker, current_user, session):
     """Test /delete_post route."""
     # Mock current_user
@@ -79,11 +175,11 @@ def test_delete_post(app: Flask, mocker, current_user, session):
     assert response.status_code == 302
     assert response.headers["Location"] == "/"
 
-def test_apply_filter(app: Flask, post_object, mocker, session):
+def test_apply_filter(app: Flask, post_summary, mocker, session):
     """Test /apply-filter route."""
     #Mock filter_posts function
     mocker.patch("app.app.filter_posts",
-                 return_value=[(post_object, "andrew@gmail.com")])
+                 return_value=[post_summary])
 
     #Mock get_session function return value
     mocker.patch("app.models.get_session", return_value=session)
@@ -92,7 +188,7 @@ def test_apply_filter(app: Flask, post_object, mocker, session):
     response = client.get("/apply-filter?title=test&username=test&tag=test")
 
     assert response.status_code == 200
-    assert bytes(post_object.title, "utf-8") in response.data
+    assert bytes(post_summary.title, "utf-8") in response.data
 
     #Simulate the scenario when form does not validate
     #by providing one of the filed values longer than allowed
@@ -101,11 +197,25 @@ def test_apply_filter(app: Flask, post_object, mocker, session):
     assert response.status_code == 200
     assert b"Offcanvas with post filtering options" in response.data
 
-def test_my_posts(app: Flask, mocker, post_object, current_user, session):
+def test_apply_filter_streamed(app: Flask, post_summary, mocker, session):
+    """Test /apply-filter route in streaming mode."""
+    mocker.patch("app.app.STREAM_LISTINGS", True)
+    filter_posts = mocker.patch("app.app.filter_posts", return_value=iter([post_summary]))
+
+    client = app.test_client()
+    response = client.get("/apply-filter?tag=test")
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert bytes(post_summary.title, "utf-8") in response.data
+    assert b"Next page" not in response.data
+    assert filter_posts.call_args.kwargs["stream"] is True
+
+def test_my_posts(app: Flask, mocker, post_summary, current_user, session):
     """Test /my-posts route."""
     # Mock delete user function
     mocker.patch("app.app.get_user_posts",
-                 return_value=[(post_object, "andrew@gmail.com")])
+                 return_value=[post_summary])
     #Mock get_session function return value
     mocker.patch("app.models.get_session", return_value=session)
     # Mock current_user so the get_user_posts call can be made
@@ -117,7 +227,7 @@ def test_my_posts(app: Flask, mocker, post_object, current_user, session):
     })
 
     assert response.status_code == 200
-    assert bytes(post_object.title, "utf-8") in response.data
+    assert bytes(post_summary.title, "utf-8") in response.data
 
 def test_login(app: Flask):
     """Tests /login route."""
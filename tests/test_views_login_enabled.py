@@ -6,6 +6,7 @@ import pytest
 from flask import Flask
 from app import make_app
 from app.app import load_usr
+from app.util import verify_password
 
 @pytest.fixture(scope="module")
 def app() -> Flask:
@@ -17,9 +18,6 @@ def test_login(app: Flask, test_user, session, mocker):
     if client is not authenticated."""
     #Mock return value of get_session function
     mocker.patch("app.models.get_session", return_value=session)
-    #Mock return value of password_hash function because
-    #test user in the database has unhashed value of password
-    mocker.patch("app.models.password_hash", return_value="password")
     client = app.test_client()
 
     response = client.post("/login", data={
@@ -30,6 +28,22 @@ def test_login(app: Flask, test_user, session, mocker):
     assert response.status_code == 302
     assert "/" == response.headers["Location"]
 
+def test_login_validates_once(app: Flask, test_user, session, mocker):
+    """Tests that credentials are validated only once per login."""
+    #Mock return value of get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    #Count password verifications
+    hasher = mocker.patch("app.models.verify_password", wraps=verify_password)
+    client = app.test_client()
+
+    response = client.post("/login", data={
+        "email": test_user.email,
+        "password": "password"
+    })
+
+    assert response.status_code == 302
+    hasher.assert_called_once()
+
 def test_register_post(app: Flask, test_user, session, mocker):
     """Confirm that user is returned registration page with errors
     if form validation fails."""
@@ -49,6 +63,33 @@ def test_register_post(app: Flask, test_user, session, mocker):
     assert response.status_code == 200
     assert b"already in-use" in response.data
 
+def test_admin_users(app: Flask, test_user, session, mocker):
+    """Tests that admins are redirected to paginated user listing."""
+    #Mock return value of get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    client = app.test_client()
+    client.post("/login", data={"email": test_user.email, "password": "password"})
+
+    response = client.get("/")
+    assert response.status_code == 302
+    assert response.headers["Location"] == "/admin/users"
+
+    response = client.get("/admin/users", query_string={"q": "a"})
+    assert response.status_code == 200
+    assert b"User List" in response.data
+
+def test_admin_users_forbidden(app: Flask, new_user, session, mocker):
+    """Tests that user listing is hidden from other users."""
+    #Mock return value of get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    client = app.test_client()
+    response = client.get("/admin/users")
+    assert response.status_code == 302
+    assert "/login" in response.headers["Location"]
+
+    client.post("/login", data={"email": new_user.email, "password": "password"})
+    assert client.get("/admin/users").status_code == 404
+
 def test_index(app: Flask):
     """Tests if / route redireccts to login page
     if client is not authenticated."""
@@ -0,0 +1,83 @@
+"""This module defines tests for the group-committing write queue located in
+app.write_queue module."""
+#pylint: disable=import-error disable=unused-argument
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app.dbschema import User, Post, ENGINE
+from app.models import add_post, unit_of_work, post_values, CACHE
+from app.write_queue import WriteQueue
+
+@pytest.fixture
+def user(test_user, session) -> tuple[int, str]:
+    """Returns id and email of the test user. The writer thread needs the
+    only pooled writer connection, so the session gives it back."""
+    loaded = test_user.id, test_user.email
+    session.commit()
+    return loaded
+
+def test_group_commit(user, session, mocker):
+    """Confirms that rows submitted together are committed in one transaction
+    and each future resolves to the id of its row."""
+    on_commit = mocker.Mock()
+    queue = WriteQueue(ENGINE, Post, max_batch=3, max_delay=0.5, on_commit=on_commit)
+    futures = [queue.submit(post_values(f"Queued {i}", "Excerpt", "Content", "tag",
+                                        user[0])) for i in range(4)]
+    ids = [future.result(timeout=5) for future in futures]
+    queue.close()
+
+    #The first three filled a batch, the last waited for the delay
+    assert on_commit.call_count == 2
+    titles = dict(session.execute(select(Post.id, Post.title).where(Post.id.in_(ids))).all())
+    assert [titles[post_id] for post_id in ids] == [f"Queued {i}" for i in range(4)]
+    session.commit()
+
+def test_rejected_row(user, session):
+    """Confirms that a row failing its batch fails alone."""
+    queue = WriteQueue(ENGINE, User, max_delay=0.5)
+    taken = queue.submit({"email": user[1], "username": "queued"})
+    added = queue.submit({"email": "queued@gmail.com", "username": "queued"})
+    queue.close()
+
+    with pytest.raises(IntegrityError):
+        taken.result()
+    assert session.get(User, added.result()).username == "queued"
+    session.commit()
+
+def test_synchronous(user):
+    """Confirms that durability of group commits does not leak to
+    other users of the pooled connection."""
+    with ENGINE.connect() as conn:
+        synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+    queue = WriteQueue(ENGINE, Post, synchronous="FULL")
+    assert queue.submit(post_values("Durable", "Excerpt", "Content", "tag",
+                                    user[0])).result(timeout=5)
+    queue.close()
+    with ENGINE.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == synchronous
+
+def test_add_post(app, user, session, mocker):
+    """Confirms that add_post goes through the queue unless its caller's
+    unit of work is open."""
+    #Mock get_session function
+    mocker.patch("app.models.get_session", return_value=session)
+    queue = WriteQueue(ENGINE, Post, max_delay=0,
+                       on_commit=lambda: CACHE.bump("feed"))
+    mocker.patch("app.models.POST_QUEUE", queue)
+    submit = mocker.spy(queue, "submit")
+    generation = CACHE.generation("feed")
+
+    with app.app_context():
+        post_id = add_post("Queued", "Excerpt", "Content", "tag", user[0])
+        assert session.get(Post, post_id).title == "Queued"
+        session.commit()
+        assert CACHE.generation("feed") != generation
+        submit.assert_called_once()
+
+        with unit_of_work():
+            add_post("Joined", "Excerpt", "Content", "tag", user[0])
+        submit.assert_called_once()
+    queue.close()
+
+def test_clean_up(session):
+    """Request fixture to trigger database clean-up before the next module."""